@@ -0,0 +1,95 @@
+"""
+Async counterpart of `database` and `models.pro_users`.
+
+Every call is handed to a dedicated thread pool, so a query waiting on the
+SQLite lock never blocks the event loop. Each worker thread keeps its own
+long-lived connection (see `database.get_connection`).
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from config import Config
+from models import pro_users
+
+_executor = ThreadPoolExecutor(max_workers=Config.DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run(func, *args, **kwargs):
+    """Runs a synchronous database function on the DB executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+async def batch(*calls):
+    """
+    Runs several `(func, *args)` calls back-to-back on one worker thread and
+    returns their results in order. Saves an executor round trip per call:
+
+        sources, target = await batch(
+            (database.get_all_sources,),
+            (database.get_target_chat,),
+        )
+    """
+    def run_all():
+        return [func(*args) for func, *args in calls]
+    return await run(run_all)
+
+def _wrap(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+# === Bot Settings ===
+get_config_version = _wrap(database.get_config_version)
+get_config_versions = _wrap(database.get_config_versions)
+add_spam_keyword = _wrap(database.add_spam_keyword)
+del_spam_keyword = _wrap(database.del_spam_keyword)
+get_all_spam_keywords = _wrap(database.get_all_spam_keywords)
+add_spam_type = _wrap(database.add_spam_type)
+del_spam_type = _wrap(database.del_spam_type)
+get_all_spam_types = _wrap(database.get_all_spam_types)
+add_source = _wrap(database.add_source)
+get_all_sources = _wrap(database.get_all_sources)
+del_source = _wrap(database.del_source)
+set_target_chat = _wrap(database.set_target_chat)
+get_target_chat = _wrap(database.get_target_chat)
+enable_ai = _wrap(database.enable_ai)
+disable_ai = _wrap(database.disable_ai)
+set_ai_model = _wrap(database.set_ai_model)
+get_ai_status = _wrap(database.get_ai_status)
+
+# === User Usage Tracking ===
+get_user_usage = _wrap(database.get_user_usage)
+save_user_usage = _wrap(database.save_user_usage)
+
+# === Post Queue Management ===
+add_to_queue = _wrap(database.add_to_queue)
+claim_due_posts = _wrap(database.claim_due_posts)
+release_post = _wrap(database.release_post)
+complete_post = _wrap(database.complete_post)
+get_upcoming_posts = _wrap(database.get_upcoming_posts)
+get_pending_ai_posts = _wrap(database.get_pending_ai_posts)
+get_post = _wrap(database.get_post)
+mark_post_ready = _wrap(database.mark_post_ready)
+remove_from_queue = _wrap(database.remove_from_queue)
+get_last_scheduled_time = _wrap(database.get_last_scheduled_time)
+get_slot_cursor = _wrap(database.get_slot_cursor)
+set_slot_cursor = _wrap(database.set_slot_cursor)
+
+# === Source Memberships ===
+get_source_memberships = _wrap(database.get_source_memberships)
+add_source_membership = _wrap(database.add_source_membership)
+
+# === FSM Storage ===
+get_fsm_record = _wrap(database.get_fsm_record)
+save_fsm_records = _wrap(database.save_fsm_records)
+
+# === PRO Users ===
+load_pro_users = _wrap(pro_users.load_pro_users)
+load_pro_user = _wrap(pro_users.load_pro_user)
+load_pro_users_by_id = _wrap(pro_users.load_pro_users_by_id)
+save_pro_user = _wrap(pro_users.save_pro_user)
+delete_pro_user = _wrap(pro_users.delete_pro_user)
+get_pro_user_revisions = _wrap(pro_users.get_pro_user_revisions)
+get_pro_user_stats = _wrap(pro_users.get_pro_user_stats)
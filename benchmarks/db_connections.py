@@ -0,0 +1,83 @@
+"""
+Microbenchmark: per-call cost of the old connect-per-call pattern versus the
+shared long-lived connections in `database`.
+
+Runs against a throwaway database file, never against userbot.db:
+
+    python -m benchmarks.db_connections [iterations]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database
+import db_migration
+
+SCHEMA = (
+    """CREATE TABLE ai_settings (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        model TEXT NOT NULL DEFAULT 'gpt-3.5-turbo',
+        is_enabled BOOLEAN NOT NULL DEFAULT 0
+    )""",
+    "INSERT INTO ai_settings (id, model, is_enabled) VALUES (1, 'gpt-3.5-turbo', 1)",
+    "CREATE TABLE spam_keywords (keyword TEXT PRIMARY KEY)",
+)
+
+def old_read(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT model, is_enabled FROM ai_settings WHERE id = 1")
+    cursor.fetchone()
+    conn.close()
+
+def old_write(path, i):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT OR REPLACE INTO spam_keywords VALUES (?)", (f"kw{i % 100}",))
+    conn.commit()
+    conn.close()
+
+def pooled_read(path):
+    database.get_ai_status()
+
+def pooled_write(path, i):
+    database.add_spam_keyword(f"kw{i % 100}")
+
+def measure(fn, path, iterations, with_index=False):
+    start = time.perf_counter()
+    for i in range(iterations):
+        if with_index:
+            fn(path, i)
+        else:
+            fn(path)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        # Settings writes bump the version stamps; use the real migration for the table
+        db_migration._create_config_version_table(conn)
+        conn.commit()
+        conn.close()
+
+        # Baseline: rollback journal, fresh connection for every call
+        old_r = measure(old_read, path, iterations)
+        old_w = measure(old_write, path, iterations, with_index=True)
+
+        database.DATABASE_NAME = path
+        database.close_connection()
+        new_r = measure(pooled_read, path, iterations)
+        new_w = measure(pooled_write, path, iterations, with_index=True)
+        database.close_connection()
+
+    print(f"{'operation':<8} {'connect-per-call':>18} {'shared conn':>12} {'speedup':>8}")
+    for name, old, new in (("read", old_r, new_r), ("write", old_w, new_w)):
+        print(f"{name:<8} {old:>15.1f} us {new:>9.1f} us {old / new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
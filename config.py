@@ -12,12 +12,125 @@ class Config:
 
     # Userbot session name
     USERBOT_SESSION = os.getenv("USERBOT_SESSION", "userbot")
+    # Session the scheduler sends with. It must differ from USERBOT_SESSION:
+    # both processes stay connected, and one auth key can't serve two live
+    # connections. Log it in once like the userbot session.
+    SCHEDULER_SESSION = os.getenv("SCHEDULER_SESSION", "scheduler")
+
+    # Posting slots: gap between posts to a target, delay before the first
+    # post of an empty queue, quiet hours such as "23-7" (local time) and
+    # per-source weights such as "@news=2,-1001234=0.5" (a weight of 2
+    # halves the gap before that source's posts)
+    SLOT_SPACING_MINUTES = float(os.getenv("SLOT_SPACING_MINUTES", "30"))
+    SLOT_INITIAL_DELAY_MINUTES = float(os.getenv("SLOT_INITIAL_DELAY_MINUTES", "5"))
+    SLOT_QUIET_HOURS = os.getenv("SLOT_QUIET_HOURS", "")
+    SLOT_SOURCE_WEIGHTS = {
+        name.strip(): float(weight)
+        for name, weight in (
+            item.split("=") for item in os.getenv("SLOT_SOURCE_WEIGHTS", "").split(",") if "=" in item
+        )
+    }
+
+    # Sending: destinations served at once, per-destination and account-wide
+    # rates. A FloodWait longer than SEND_FLOOD_MAX_HOLD seconds hands the
+    # posts back to the queue instead of holding them.
+    SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "4"))
+    SEND_PER_TARGET_PER_MINUTE = float(os.getenv("SEND_PER_TARGET_PER_MINUTE", "20"))
+    SEND_PER_TARGET_BURST = int(os.getenv("SEND_PER_TARGET_BURST", "3"))
+    SEND_GLOBAL_PER_SECOND = float(os.getenv("SEND_GLOBAL_PER_SECOND", "25"))
+    SEND_FLOOD_MAX_HOLD = int(os.getenv("SEND_FLOOD_MAX_HOLD", "60"))
 
     # Database
     DATABASE_NAME = os.getenv("DATABASE_NAME", "userbot.db")
+    # Worker threads that run queries for async handlers
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+    # Spam filter: also match Cyrillic text against Latin keywords and vice versa
+    SPAM_TRANSLITERATE = os.getenv("SPAM_TRANSLITERATE", "1") == "1"
 
     # OpenAI API
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # Seconds before a completion request is abandoned
+    AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+    AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+    # In-flight completions across all models, and per model by default
+    AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "16"))
+    AI_MODEL_CONCURRENCY_DEFAULT = int(os.getenv("AI_MODEL_CONCURRENCY_DEFAULT", "8"))
+    # Per-model overrides, e.g. "gpt-4=2,gpt-4o=4"
+    AI_MODEL_CONCURRENCY = {
+        name.strip(): int(limit)
+        for name, limit in (
+            item.split("=") for item in os.getenv("AI_MODEL_CONCURRENCY", "").split(",") if "=" in item
+        )
+    }
+
+    # Seconds to wait for further items of a source album before queueing it
+    ALBUM_WINDOW_SECONDS = float(os.getenv("ALBUM_WINDOW_SECONDS", "1.5"))
+
+    # Stream bot chat replies into the message as they are generated, with
+    # at most one edit per STREAM_EDIT_INTERVAL seconds
+    AI_STREAM_REPLIES = os.getenv("AI_STREAM_REPLIES", "1") == "1"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+    # Bot chat prompts: token budget per request, and the model and length
+    # of the rolling summary that older turns are folded into
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+    CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-3.5-turbo")
+    CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+
+    # Background AI workers that paraphrase/caption queued posts
+    AI_WORKERS = int(os.getenv("AI_WORKERS", "4"))
+
+    # Images sent for captioning: the smallest Telegram size whose short side
+    # is at least CAPTION_IMAGE_MIN_SIDE is downloaded, then (with Pillow)
+    # downscaled to CAPTION_IMAGE_MAX_PIXELS and recompressed on IMAGE_WORKERS threads
+    CAPTION_IMAGE_MIN_SIDE = int(os.getenv("CAPTION_IMAGE_MIN_SIDE", "512"))
+    CAPTION_IMAGE_MAX_PIXELS = int(os.getenv("CAPTION_IMAGE_MAX_PIXELS", str(768 * 768)))
+    CAPTION_IMAGE_QUALITY = int(os.getenv("CAPTION_IMAGE_QUALITY", "80"))
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+    # Posts whose text has fewer letters and digits than this once mentions,
+    # links and signatures are stripped are not sent to the model
+    TEXT_MIN_USEFUL_CHARS = int(os.getenv("TEXT_MIN_USEFUL_CHARS", "12"))
+
+    # AI triage: text with fewer words than TRIAGE_SHORT_WORDS or a lower
+    # share of distinct words than TRIAGE_MIN_NOVELTY is not paraphrased;
+    # English gets the tag appended, anything else is only translated with
+    # TRANSLATE_MODEL. Latin text longer than a headline whose language
+    # score (trigram plus function-word share) stays below TRIAGE_MIN_SCORE
+    # counts as an unknown language.
+    TRIAGE_SHORT_WORDS = int(os.getenv("TRIAGE_SHORT_WORDS", "15"))
+    TRIAGE_MIN_NOVELTY = float(os.getenv("TRIAGE_MIN_NOVELTY", "0.4"))
+    TRIAGE_MIN_SCORE = float(os.getenv("TRIAGE_MIN_SCORE", "0.12"))
+    TRANSLATE_MODEL = os.getenv("TRANSLATE_MODEL", "gpt-3.5-turbo")
+
+    # Paraphrase/caption result cache
+    AI_CACHE_MEMORY_SIZE = int(os.getenv("AI_CACHE_MEMORY_SIZE", "1024"))
+    AI_CACHE_TTL_HOURS = int(os.getenv("AI_CACHE_TTL_HOURS", "72"))
+    AI_CACHE_MAX_ROWS = int(os.getenv("AI_CACHE_MAX_ROWS", "50000"))
+
+    # Near-duplicate detection window for incoming source posts
+    DEDUP_WINDOW_SIZE = int(os.getenv("DEDUP_WINDOW_SIZE", "5000"))
+    DEDUP_WINDOW_HOURS = int(os.getenv("DEDUP_WINDOW_HOURS", "48"))
+    # Max differing SimHash bits (of 64) for two texts to count as duplicates
+    DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "7"))
+
+    # AI chat quotas per tier over a sliding window (0 = unlimited), and how
+    # often usage counters are written to the database
+    RATE_LIMIT_FREE = int(os.getenv("RATE_LIMIT_FREE", "5"))
+    RATE_LIMIT_PRO = int(os.getenv("RATE_LIMIT_PRO", "0"))
+    RATE_WINDOW_HOURS = int(os.getenv("RATE_WINDOW_HOURS", "24"))
+    RATE_FLUSH_SECONDS = float(os.getenv("RATE_FLUSH_SECONDS", "30"))
+
+    # Bot conversation state: conversations kept in memory, days of
+    # inactivity before one is forgotten, and seconds between disk flushes
+    FSM_MEMORY_ENTRIES = int(os.getenv("FSM_MEMORY_ENTRIES", "2000"))
+    FSM_IDLE_DAYS = int(os.getenv("FSM_IDLE_DAYS", "7"))
+    FSM_FLUSH_SECONDS = float(os.getenv("FSM_FLUSH_SECONDS", "30"))
+
+    # PRO status lookups: seconds an entry is trusted, and entries kept
+    PRO_CACHE_TTL_SECONDS = int(os.getenv("PRO_CACHE_TTL_SECONDS", "300"))
+    PRO_CACHE_SIZE = int(os.getenv("PRO_CACHE_SIZE", "100000"))
 
     # Supported AI models (must match OpenAI format)
     AI_MODELS = {
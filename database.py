@@ -1,209 +1,453 @@
-import sqlite3
-from config import Config
-
-DATABASE_NAME = Config.DATABASE_NAME
-
-def add_spam_keyword(keyword: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("INSERT OR REPLACE INTO spam_keywords VALUES (?)", (keyword,));
-    conn.commit()
-    conn.close()
-
-def del_spam_keyword(keyword: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("DELETE FROM spam_keywords WHERE keyword = ?", (keyword,))
-    conn.commit()
-    conn.close()
-
-def get_all_spam_keywords():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT keyword FROM spam_keywords")
-    spam_keywords = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return spam_keywords
-
-def add_spam_type(spam_type: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("INSERT OR REPLACE INTO spam_types (type_name) VALUES (?)", (spam_type,));
-    conn.commit()
-    conn.close()
-
-def del_spam_type(spam_type: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("DELETE FROM spam_types WHERE type_name = ?", (spam_type,))
-    conn.commit()
-    conn.close()
-
-def get_all_spam_types():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT type_name FROM spam_types")
-    spam_types = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return spam_types
-
-def add_source(username: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("INSERT OR REPLACE INTO sources VALUES (?, CURRENT_TIMESTAMP)", (username,))
-    conn.commit()
-    conn.close()
-
-def get_all_sources():
-    """Get all source channels/groups"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT username FROM sources ORDER BY added_at DESC")
-    sources = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return sources
-
-def del_source(username: str):
-    """Remove a source channel/group"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("DELETE FROM sources WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
-
-def set_target_chat(username: str):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("DELETE FROM target_chat")  # Clear previous
-    conn.execute("INSERT INTO target_chat VALUES (?)", (username,))
-    conn.commit()
-    conn.close()
-
-def get_target_chat():
-    """Get current target channel"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT username FROM target_chat LIMIT 1")
-    target = cursor.fetchone()
-    conn.close()
-    return target[0] if target else None
-
-def enable_ai():
-    """Enable AI message processing"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("UPDATE ai_settings SET is_enabled = 1 WHERE id = 1")
-    conn.commit()
-    conn.close()
-
-def disable_ai():
-    """Disable AI message processing"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("UPDATE ai_settings SET is_enabled = 0 WHERE id = 1")
-    conn.commit()
-    conn.close()
-
-def set_ai_model(model: str):
-    """Change active AI model"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("UPDATE ai_settings SET model = ? WHERE id = 1", (model,))
-    conn.commit()
-    conn.close()
-
-def get_ai_status():
-    """Get current AI settings"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT model, is_enabled FROM ai_settings WHERE id = 1")
-    result = cursor.fetchone()
-    conn.close()
-    return {
-        'model': result[0],
-        'enabled': bool(result[1])
+import sqlite3
+import threading
+from config import Config
+
+DATABASE_NAME = Config.DATABASE_NAME
+
+# === Connection Management ===
+# Userbot, scheduler and control bot all share the same SQLite file, so every
+# thread keeps one long-lived connection instead of reconnecting per call.
+# WAL lets readers proceed while another process writes, and busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked".
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",  # ~8 MB page cache per connection
+)
+
+_local = threading.local()
+
+def open_connection(path: str = None) -> sqlite3.Connection:
+    """Open a new connection with the shared pragmas applied."""
+    conn = sqlite3.connect(
+        path or DATABASE_NAME,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the calling thread's long-lived connection, opening it on first use.
+    Use it as `with get_connection() as conn:` to commit (or roll back) the
+    statements in the block; the connection itself stays open.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = open_connection()
+        _local.conn = conn
+    return conn
+
+def close_connection():
+    """Closes the calling thread's connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# === Config Versioning ===
+
+def bump_config_version(conn: sqlite3.Connection, scope: str = "config"):
+    """Marks `scope` as changed; call inside the writing transaction."""
+    conn.execute("UPDATE config_version SET version = version + 1 WHERE scope = ?", (scope,))
+
+def get_config_version(scope: str = "config") -> int:
+    """Returns the current version stamp of `scope` (0 if never written)."""
+    row = get_connection().execute(
+        "SELECT version FROM config_version WHERE scope = ?", (scope,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def get_config_versions(scopes) -> tuple:
+    """Returns the version stamps of several scopes in one query, in the given order."""
+    placeholders = ", ".join("?" for _ in scopes)
+    rows = dict(get_connection().execute(
+        f"SELECT scope, version FROM config_version WHERE scope IN ({placeholders})", tuple(scopes)
+    ).fetchall())
+    return tuple(rows.get(scope, 0) for scope in scopes)
+
+def read_config() -> dict:
+    """
+    Reads every userbot setting plus its version stamp in one read transaction,
+    so the result is never a mix of two admin edits.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN")
+    try:
+        return {
+            'version': get_config_version(),
+            'sources': get_all_sources(),
+            'target': get_target_chat(),
+            'spam_keywords': get_all_spam_keywords(),
+            'spam_types': get_all_spam_types(),
+            'ai_settings': get_ai_status(),
+        }
+    finally:
+        conn.commit()
+
+# === Bot Settings ===
+
+def add_spam_keyword(keyword: str):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO spam_keywords VALUES (?)", (keyword,))
+        bump_config_version(conn)
+
+def del_spam_keyword(keyword: str):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM spam_keywords WHERE keyword = ?", (keyword,))
+        bump_config_version(conn)
+
+def get_all_spam_keywords():
+    cursor = get_connection().execute("SELECT keyword FROM spam_keywords")
+    return [row[0] for row in cursor.fetchall()]
+
+def add_spam_type(spam_type: str):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO spam_types (type_name) VALUES (?)", (spam_type,))
+        bump_config_version(conn)
+
+def del_spam_type(spam_type: str):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM spam_types WHERE type_name = ?", (spam_type,))
+        bump_config_version(conn)
+
+def get_all_spam_types():
+    cursor = get_connection().execute("SELECT type_name FROM spam_types")
+    return [row[0] for row in cursor.fetchall()]
+
+def add_source(username: str):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO sources VALUES (?, CURRENT_TIMESTAMP)", (username,))
+        bump_config_version(conn)
+
+def get_all_sources():
+    """Get all source channels/groups"""
+    cursor = get_connection().execute("SELECT username FROM sources ORDER BY added_at DESC")
+    return [row[0] for row in cursor.fetchall()]
+
+def del_source(username: str):
+    """Remove a source channel/group"""
+    with get_connection() as conn:
+        conn.execute("DELETE FROM sources WHERE username = ?", (username,))
+        bump_config_version(conn)
+
+def set_target_chat(username: str):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM target_chat")  # Clear previous
+        conn.execute("INSERT INTO target_chat VALUES (?)", (username,))
+        bump_config_version(conn)
+
+def get_target_chat():
+    """Get current target channel"""
+    target = get_connection().execute("SELECT username FROM target_chat LIMIT 1").fetchone()
+    return target[0] if target else None
+
+def enable_ai():
+    """Enable AI message processing"""
+    with get_connection() as conn:
+        conn.execute("UPDATE ai_settings SET is_enabled = 1 WHERE id = 1")
+        bump_config_version(conn)
+
+def disable_ai():
+    """Disable AI message processing"""
+    with get_connection() as conn:
+        conn.execute("UPDATE ai_settings SET is_enabled = 0 WHERE id = 1")
+        bump_config_version(conn)
+
+def set_ai_model(model: str):
+    """Change active AI model"""
+    with get_connection() as conn:
+        conn.execute("UPDATE ai_settings SET model = ? WHERE id = 1", (model,))
+        bump_config_version(conn)
+
+def get_ai_status():
+    """Get current AI settings"""
+    result = get_connection().execute(
+        "SELECT model, is_enabled FROM ai_settings WHERE id = 1"
+    ).fetchone()
+    return {
+        'model': result[0],
+        'enabled': bool(result[1])
     } if result else None
 
 # === User Usage Tracking ===
-from datetime import date
 
-def check_and_update_user(user_id: int) -> int:
+def get_user_usage(user_id: int):
+    """Returns (requests_count, last_request_date, usage_window) or None."""
+    return get_connection().execute(
+        "SELECT requests_count, last_request_date, usage_window FROM users WHERE user_id = ?", (user_id,)
+    ).fetchone()
+
+def save_user_usage(rows):
+    """Upserts (user_id, requests_count, last_request_date, usage_window) rows in one transaction."""
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO users (user_id, requests_count, last_request_date, usage_window) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                requests_count = excluded.requests_count,
+                last_request_date = excluded.last_request_date,
+                usage_window = excluded.usage_window
+            """,
+            rows
+        )
+
+# === Post Queue Management ===
+import datetime
+import time
+import json
+
+# Post states: 'pending_ai' rows wait for an AI worker, 'ready' rows for the
+# scheduler, and 'sending' rows are leased by one scheduler worker until
+# lease_expires. scheduled_for and lease_expires are unix epoch seconds.
+POST_PENDING_AI = 'pending_ai'
+POST_READY = 'ready'
+POST_SENDING = 'sending'
+
+def add_to_queue(source_message_id: int, source_chat_id: int, content_type: str, scheduled_for: datetime.datetime, file_id: str = None, caption: str = None,
+                 status: str = POST_READY, ai_task: str = None, media: list = None,
+                 target: str = None, tenant_id: int = None, ai_model: str = None) -> int:
     """
-    Checks a user's request count. If the last request was on a previous day,
-    resets the count. Creates the user if they don't exist.
-    Returns the current request count for today.
+    Adds a new post to the sending queue and returns its id. Albums are
+    queued as one 'album' post with their items in `media` as
+    (content_type, file_id) pairs. PRO fan-out rows carry their tenant's
+    `target` and `ai_model`; NULL means the global settings.
     """
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    today = date.today().isoformat()
-
-    # Try to get the user
-    cursor.execute("SELECT requests_count, last_request_date FROM users WHERE user_id = ?", (user_id,))
-    user_data = cursor.fetchone()
-
-    if user_data:
-        requests_count, last_request_date = user_data
-        if last_request_date != today:
-            # It's a new day, reset the count
-            requests_count = 0
-            cursor.execute(
-                "UPDATE users SET requests_count = 0, last_request_date = ? WHERE user_id = ?",
-                (today, user_id)
-            )
-    else:
-        # User does not exist, create them
-        requests_count = 0
-        cursor.execute(
-            "INSERT INTO users (user_id, requests_count, last_request_date) VALUES (?, ?, ?)",
-            (user_id, 0, today)
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO post_queue (source_message_id, source_chat_id, content_type, file_id, caption, scheduled_for, status, ai_task, media,
+                                    target, tenant_id, ai_model)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (source_message_id, source_chat_id, content_type, file_id, caption, int(scheduled_for.timestamp()), status, ai_task,
+             json.dumps(media) if media else None, target, tenant_id, ai_model)
         )
+        if status == POST_READY:
+            bump_config_version(conn, 'queue')
+    return cursor.lastrowid
 
-    conn.commit()
-    conn.close()
-    return requests_count
+def claim_due_posts(owner: str, limit: int, lease_seconds: int):
+    """
+    Atomically leases up to `limit` due posts to `owner` and returns them as
+    (id, content_type, file_id, caption, media, target), earliest first. Posts whose lease
+    expired (their worker died mid-send) are claimable again.
+    """
+    now = int(time.time())
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            UPDATE post_queue
+            SET status = ?, lease_owner = ?, lease_expires = ?
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, scheduled_for FROM post_queue WHERE status = ? AND scheduled_for <= ?
+                    UNION ALL
+                    SELECT id, scheduled_for FROM post_queue WHERE status = ? AND lease_expires <= ?
+                ) ORDER BY scheduled_for LIMIT ?
+            )
+            RETURNING id, content_type, file_id, caption, media, target, scheduled_for
+            """,
+            (POST_SENDING, owner, now + lease_seconds, POST_READY, now, POST_SENDING, now, limit)
+        ).fetchall()
+    rows.sort(key=lambda row: (row[6], row[0]))
+    return [row[:4] + (json.loads(row[4]) if row[4] else None, row[5]) for row in rows]
 
-def increment_request_count(user_id: int):
-    """Increments the request count for a user."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET requests_count = requests_count + 1 WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+def release_post(post_id: int, owner: str, retry_at: int):
+    """Gives a leased post back to the queue, to be retried at `retry_at`."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE post_queue SET status = ?, scheduled_for = ?, lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (POST_READY, retry_at, post_id, owner)
+        )
 
-# === Post Queue Management ===
-import datetime
+def complete_post(post_id: int, owner: str):
+    """Removes a sent post, provided `owner` still holds its lease."""
+    with get_connection() as conn:
+        conn.execute("DELETE FROM post_queue WHERE id = ? AND lease_owner = ?", (post_id, owner))
 
-def add_to_queue(source_message_id: int, source_chat_id: int, content_type: str, scheduled_for: datetime.datetime, file_id: str = None, caption: str = None):
-    """Adds a new post to the sending queue."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute(
+def get_upcoming_posts(limit: int):
+    """
+    Gets (id, due_at) of the next posts the scheduler will have to act on:
+    ready posts by scheduled time and leased posts by lease expiry.
+    """
+    cursor = get_connection().execute(
         """
-        INSERT INTO post_queue (source_message_id, source_chat_id, content_type, file_id, caption, scheduled_for)
-        VALUES (?, ?, ?, ?, ?, ?)
+        SELECT id, due_at FROM (
+            SELECT id, scheduled_for AS due_at FROM post_queue WHERE status = ?
+            UNION ALL
+            SELECT id, lease_expires AS due_at FROM post_queue WHERE status = ?
+        ) ORDER BY due_at LIMIT ?
         """,
-        (source_message_id, source_chat_id, content_type, file_id, caption, scheduled_for)
+        (POST_READY, POST_SENDING, limit)
     )
-    conn.commit()
-    conn.close()
-
-def get_due_posts():
-    """Gets all posts from the queue that are due to be sent."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    now = datetime.datetime.now()
-    cursor.execute(
-        "SELECT id, content_type, file_id, caption FROM post_queue WHERE scheduled_for <= ?",
-        (now,)
+    return cursor.fetchall()
+
+def get_pending_ai_posts(limit: int):
+    """Gets the ids of the oldest posts still waiting for AI processing."""
+    cursor = get_connection().execute(
+        "SELECT id FROM post_queue WHERE status = ? ORDER BY id LIMIT ?",
+        (POST_PENDING_AI, limit)
     )
-    posts = cursor.fetchall()
-    conn.close()
-    return posts
+    return [row[0] for row in cursor.fetchall()]
+
+def get_post(post_id: int):
+    """Gets a queued post as a dict, or None if it no longer exists."""
+    row = get_connection().execute(
+        """
+        SELECT id, source_message_id, source_chat_id, content_type, file_id, caption, status, ai_task, tenant_id, ai_model, target
+        FROM post_queue WHERE id = ?
+        """,
+        (post_id,)
+    ).fetchone()
+    if not row:
+        return None
+    keys = ('id', 'source_message_id', 'source_chat_id', 'content_type', 'file_id', 'caption', 'status', 'ai_task',
+            'tenant_id', 'ai_model', 'target')
+    return dict(zip(keys, row))
+
+def mark_post_ready(post_id: int, caption: str = None):
+    """Stores the AI result (if any) and hands the post over to the scheduler."""
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE post_queue SET caption = COALESCE(?, caption), status = ? WHERE id = ? AND status = ?",
+            (caption, POST_READY, post_id, POST_PENDING_AI)
+        )
+        bump_config_version(conn, 'queue')
 
 def remove_from_queue(post_id: int):
-    """Removes a post from the queue after it has been sent."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.execute("DELETE FROM post_queue WHERE id = ?", (post_id,))
-    conn.commit()
-    conn.close()
+    """Removes a post from the queue."""
+    with get_connection() as conn:
+        conn.execute("DELETE FROM post_queue WHERE id = ?", (post_id,))
 
 def get_last_scheduled_time():
     """Gets the timestamp of the last scheduled post in the queue."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(scheduled_for) FROM post_queue")
-    result = cursor.fetchone()
-    conn.close()
+    result = get_connection().execute("SELECT MAX(scheduled_for) FROM post_queue").fetchone()
     if result and result[0]:
-        # SQLite returns timestamp as string, so we need to parse it
-        return datetime.datetime.fromisoformat(result[0])
-    return None
\ No newline at end of file
+        return datetime.datetime.fromtimestamp(result[0])
+    return None
+
+# === Slot Allocation ===
+
+def get_slot_cursor(target: str):
+    """Returns the last slot handed out for `target` as an epoch, or None."""
+    row = get_connection().execute("SELECT cursor FROM slot_cursors WHERE target = ?", (target,)).fetchone()
+    return row[0] if row else None
+
+def set_slot_cursor(target: str, cursor: int):
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO slot_cursors (target, cursor) VALUES (?, ?)
+            ON CONFLICT(target) DO UPDATE SET cursor = MAX(cursor, excluded.cursor)
+            """,
+            (target, cursor)
+        )
+
+# === Source Memberships ===
+
+def get_source_memberships():
+    """Returns {normalized source name: chat_id} for sources the userbot has joined."""
+    return dict(get_connection().execute("SELECT name, chat_id FROM source_memberships").fetchall())
+
+def add_source_membership(name: str, chat_id: int):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO source_memberships (name, chat_id) VALUES (?, ?)", (name, chat_id))
+
+# === FSM Storage ===
+
+def get_fsm_record(key: str):
+    """Returns (state, compressed data) of a stored conversation, or None."""
+    return get_connection().execute("SELECT state, data FROM fsm_storage WHERE key = ?", (key,)).fetchone()
+
+def save_fsm_records(rows):
+    """Writes (key, state, data, updated_at) rows in one transaction; rows without state or data are deleted."""
+    with get_connection() as conn:
+        conn.executemany("DELETE FROM fsm_storage WHERE key = ?", [(row[0],) for row in rows if row[1] is None and row[2] is None])
+        conn.executemany(
+            "INSERT OR REPLACE INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+            [row for row in rows if row[1] is not None or row[2] is not None]
+        )
+
+def prune_fsm_records(before: int) -> int:
+    """Deletes conversations not written since `before`."""
+    with get_connection() as conn:
+        return conn.execute("DELETE FROM fsm_storage WHERE updated_at < ?", (before,)).rowcount
+
+# === AI Result Cache ===
+
+def get_cached_result(key: str, now: int):
+    """Returns (value, expires_at) of a cached AI result that has not expired yet, or None."""
+    return get_connection().execute(
+        "SELECT value, expires_at FROM ai_cache WHERE key = ? AND expires_at > ?", (key, now)
+    ).fetchone()
+
+def touch_cached_results(rows):
+    """Records when cached results were last used; `rows` are (last_used_at, key) pairs."""
+    with get_connection() as conn:
+        conn.executemany("UPDATE ai_cache SET last_used_at = ? WHERE key = ?", rows)
+
+def put_cached_result(key: str, value: str, now: int, ttl: int):
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO ai_cache (key, value, created_at, expires_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (key, value, now, now + ttl, now)
+        )
+
+def evict_cached_results(now: int, max_rows: int) -> int:
+    """Drops expired entries, then the least recently used ones beyond `max_rows`."""
+    with get_connection() as conn:
+        removed = conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,)).rowcount
+        removed += conn.execute(
+            """
+            DELETE FROM ai_cache WHERE key IN (
+                SELECT key FROM ai_cache ORDER BY last_used_at ASC
+                LIMIT MAX((SELECT COUNT(*) FROM ai_cache) - ?, 0)
+            )
+            """,
+            (max_rows,)
+        ).rowcount
+    return removed
+
+# === Duplicate Detection ===
+
+def add_seen_posts(rows):
+    """Records accepted posts; `rows` are (target, kind, fingerprint, created_at)."""
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO seen_posts (target, kind, fingerprint, created_at) VALUES (?, ?, ?, ?)", rows
+        )
+
+def get_seen_posts(since: int, limit: int):
+    """Returns the newest `limit` fingerprints recorded after `since`, oldest first."""
+    cursor = get_connection().execute(
+        """
+        SELECT target, kind, fingerprint, created_at FROM (
+            SELECT id, target, kind, fingerprint, created_at FROM seen_posts
+            WHERE created_at > ? ORDER BY id DESC LIMIT ?
+        ) ORDER BY id ASC
+        """,
+        (since, limit)
+    )
+    return cursor.fetchall()
+
+def prune_seen_posts(before: int, keep: int) -> int:
+    """Deletes fingerprints older than `before` and all but the newest `keep`."""
+    with get_connection() as conn:
+        removed = conn.execute("DELETE FROM seen_posts WHERE created_at <= ?", (before,)).rowcount
+        removed += conn.execute(
+            "DELETE FROM seen_posts WHERE id <= (SELECT MAX(id) FROM seen_posts) - ?", (keep,)
+        ).rowcount
+    return removed
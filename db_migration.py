@@ -1,13 +1,13 @@
-import sqlite3
-from config import Config
+import datetime
+import json
+import database
 
-def migrate():
-    print("Running database migration...")
-    conn = sqlite3.connect(Config.DATABASE_NAME)
-    cursor = conn.cursor()
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so each one executes exactly once per database. Only append here.
 
+def _create_users_table(conn):
     # Create users table for tracking usage
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             requests_count INTEGER DEFAULT 0,
@@ -15,9 +15,240 @@ def migrate():
         )
     """)
 
-    conn.commit()
-    conn.close()
-    print("Migration completed successfully.")
+def _create_config_version_table(conn):
+    # Bumped by every settings write so readers can cache until it changes
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS config_version (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO config_version (scope, version) VALUES ('config', 0)")
+
+def _rename_spam_types_column(conn):
+    # Early databases named the column "type"; the code reads "type_name"
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(spam_types)")]
+    if "type" in columns and "type_name" not in columns:
+        conn.execute("ALTER TABLE spam_types RENAME COLUMN type TO type_name")
+
+def _create_ai_cache_table(conn):
+    # Disk tier of services.ai_cache; keys are content hashes
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            last_used_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_expires_at ON ai_cache (expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used_at ON ai_cache (last_used_at)")
+
+def _create_seen_posts_table(conn):
+    # Sliding window of accepted posts for services.dedup
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS seen_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_posts_created_at ON seen_posts (created_at)")
+
+def _add_post_queue_status(conn):
+    # Ingest stores raw posts as 'pending_ai'; AI workers mark them 'ready'
+    conn.execute("ALTER TABLE post_queue ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+    conn.execute("ALTER TABLE post_queue ADD COLUMN ai_task TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_post_queue_status ON post_queue (status)")
+
+def _add_queue_version(conn):
+    # Bumped whenever a post becomes ready, to wake the scheduler
+    conn.execute("INSERT OR IGNORE INTO config_version (scope, version) VALUES ('queue', 0)")
+
+def _rebuild_post_queue_with_leases(conn):
+    # scheduled_for becomes an indexed unix epoch (it held naive local-time
+    # strings), and leases let several schedulers share the queue safely.
+    conn.execute("""
+        CREATE TABLE post_queue_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_message_id INTEGER,
+            source_chat_id INTEGER,
+            content_type TEXT NOT NULL,
+            file_id TEXT,
+            caption TEXT,
+            scheduled_for INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ready',
+            ai_task TEXT,
+            lease_owner TEXT,
+            lease_expires INTEGER
+        )
+    """)
+    rows = conn.execute("""
+        SELECT id, source_message_id, source_chat_id, content_type, file_id, caption, scheduled_for, status, ai_task
+        FROM post_queue
+    """).fetchall()
+    for row in rows:
+        scheduled_for = row[6]
+        if not isinstance(scheduled_for, (int, float)):
+            scheduled_for = datetime.datetime.fromisoformat(str(scheduled_for)).timestamp()
+        conn.execute(
+            "INSERT INTO post_queue_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL)",
+            row[:6] + (int(scheduled_for),) + row[7:]
+        )
+    conn.execute("DROP TABLE post_queue")
+    conn.execute("ALTER TABLE post_queue_new RENAME TO post_queue")
+    conn.execute("CREATE INDEX idx_post_queue_status_scheduled ON post_queue (status, scheduled_for)")
+    conn.execute("CREATE INDEX idx_post_queue_status_lease ON post_queue (status, lease_expires)")
+
+def _create_slot_cursors_table(conn):
+    # Last posting slot handed out per target, for services.slot_allocator
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS slot_cursors (
+            target TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL
+        )
+    """)
+
+def _add_post_queue_media(conn):
+    # Items of an 'album' post, as a JSON list of [content_type, file_id]
+    conn.execute("ALTER TABLE post_queue ADD COLUMN media TEXT")
+
+def _add_pro_user_revisions(conn):
+    # Lets the userbot's tenant router reload only PRO users that changed
+    conn.execute("ALTER TABLE pro_users ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    conn.execute("INSERT OR IGNORE INTO config_version (scope, version) VALUES ('pro_users', 0)")
+
+def _add_post_queue_routing(conn):
+    # PRO fan-out: per-row destination and AI model, NULL meaning the global
+    # target and model, plus the tenant the row was queued for
+    conn.execute("ALTER TABLE post_queue ADD COLUMN target TEXT")
+    conn.execute("ALTER TABLE post_queue ADD COLUMN tenant_id INTEGER")
+    conn.execute("ALTER TABLE post_queue ADD COLUMN ai_model TEXT")
+
+def _normalize_pro_user_settings(conn):
+    # source_channels, filters and media_types move out of JSON columns into
+    # child tables, and expiry queries get an index. Child primary keys start
+    # with user_id, which covers per-user lookups.
+    conn.execute("""
+        CREATE TABLE pro_users_new (
+            user_id INTEGER PRIMARY KEY,
+            expires_at TEXT,
+            target_channel TEXT,
+            active BOOLEAN,
+            ai_enabled BOOLEAN,
+            ai_model TEXT,
+            revision INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    children = (
+        ('pro_user_sources', 'channel'),
+        ('pro_user_filters', 'keyword'),
+        ('pro_user_media_types', 'media_type'),
+    )
+    for table, column in children:
+        conn.execute(f"""
+            CREATE TABLE {table} (
+                user_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                {column} TEXT NOT NULL,
+                PRIMARY KEY (user_id, position)
+            ) WITHOUT ROWID
+        """)
+
+    rows = conn.execute("""
+        SELECT user_id, expires_at, target_channel, active, ai_enabled, ai_model, revision,
+               source_channels, filters, media_types
+        FROM pro_users
+    """).fetchall()
+    for row in rows:
+        conn.execute("INSERT INTO pro_users_new VALUES (?, ?, ?, ?, ?, ?, ?)", row[:7])
+        for (table, column), blob in zip(children, row[7:]):
+            try:
+                values = json.loads(blob) if blob else []
+            except ValueError:
+                values = []
+            conn.executemany(
+                f"INSERT INTO {table} (user_id, position, {column}) VALUES (?, ?, ?)",
+                [(row[0], position, str(value)) for position, value in enumerate(values)]
+            )
+    conn.execute("DROP TABLE pro_users")
+    conn.execute("ALTER TABLE pro_users_new RENAME TO pro_users")
+    conn.execute("CREATE INDEX idx_pro_users_expires_at ON pro_users (expires_at)")
+
+def _add_users_usage_window(conn):
+    # Sliding-window buckets of services.rate_limiter, as JSON {bucket: count}
+    conn.execute("ALTER TABLE users ADD COLUMN usage_window TEXT")
+
+def _create_fsm_storage_table(conn):
+    # Cold tier of services.fsm_storage; data is zlib-compressed JSON
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data BLOB,
+            updated_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at ON fsm_storage (updated_at)")
+
+def _add_seen_posts_target(conn):
+    # Duplicates are tracked per destination; '' is the global target
+    conn.execute("ALTER TABLE seen_posts ADD COLUMN target TEXT NOT NULL DEFAULT ''")
+
+def _create_source_memberships_table(conn):
+    # Sources the userbot account is known to be a member of, so a restart
+    # doesn't send Telegram a join request per source
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS source_memberships (
+            name TEXT PRIMARY KEY,
+            chat_id INTEGER NOT NULL
+        )
+    """)
+
+def _drop_pro_user_sources_channel_index(conn):
+    # Nothing looks PRO users up by source: the userbot routes through its own
+    # in-memory index of normalized names
+    conn.execute("DROP INDEX IF EXISTS idx_pro_user_sources_channel")
+
+MIGRATIONS = [
+    _create_users_table,
+    _create_config_version_table,
+    _rename_spam_types_column,
+    _create_ai_cache_table,
+    _create_seen_posts_table,
+    _add_post_queue_status,
+    _add_queue_version,
+    _rebuild_post_queue_with_leases,
+    _create_slot_cursors_table,
+    _add_post_queue_media,
+    _add_pro_user_revisions,
+    _add_post_queue_routing,
+    _normalize_pro_user_settings,
+    _add_users_usage_window,
+    _create_fsm_storage_table,
+    _add_seen_posts_target,
+    _create_source_memberships_table,
+    _drop_pro_user_sources_channel_index,
+]
+
+def migrate():
+    print("Running database migration...")
+    conn = database.get_connection()
+    # Take the write lock before reading the version so concurrently starting
+    # processes don't apply the same migration twice.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current + 1, len(MIGRATIONS) + 1):
+            MIGRATIONS[version - 1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"Migration completed successfully (schema version {len(MIGRATIONS)}).")
 
 if __name__ == "__main__":
     migrate()
@@ -2,7 +2,6 @@ import os
 import sys
 import logging
 import subprocess
-import openai
 import httpx
 
 from aiogram import Router, F
@@ -11,12 +10,13 @@ from aiogram.fsm.context import FSMContext
 
 from config import config
 import database
+import async_database
 from keyboards import main_menu, cancel_keyboard
 from handlers.state_groups import AdminStates  # Corrected import
-from models.pro_users import load_pro_users
+from services import ai_client
+from scheduler import scheduler
 
 admin_router = Router()
-pro_users = load_pro_users()
 logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
@@ -52,23 +52,32 @@ async def cancel_handler(callback: CallbackQuery, state: FSMContext):
     await callback.answer("❌ Action cancelled.")
 
 @admin_router.callback_query(F.data == "admin:info")
-async def bot_info_callback(callback: CallbackQuery):
+async def bot_info_callback(callback: CallbackQuery, state: FSMContext):
     if not await is_admin(callback.from_user.id):
         return await callback.answer("🚫 Access denied.", show_alert=True)
     try:
-        ai = database.get_ai_status()
-        sources = database.get_all_sources()
-        keywords = database.get_all_spam_keywords()
-        types = database.get_all_spam_types()
+        ai, sources, keywords, types, target = await async_database.batch(
+            (database.get_ai_status,),
+            (database.get_all_sources,),
+            (database.get_all_spam_keywords,),
+            (database.get_all_spam_types,),
+            (database.get_target_chat,),
+        )
 
         msg = [
             f"📡 Sources: {', '.join(sources) if sources else 'None'}",
-            f"🎯 Target: {database.get_target_chat() or 'Not set'}",
+            f"🎯 Target: {target or 'Not set'}",
             f"🧾 Keywords: {', '.join(keywords) if keywords else 'None'}",
             f"🧱 Types: {', '.join(types) if types else 'None'}",
             f"🤖 Model: {ai.get('model', 'Not set')}",
             "🟢 AI is ON" if ai.get('enabled') else "🔴 AI is OFF"
         ]
+        if hasattr(state.storage, "stats"):
+            fsm = state.storage.stats()
+            msg.append(
+                f"💬 Conversations in memory: {fsm['memory_entries']}/{fsm['max_entries']} "
+                f"(~{fsm['memory_bytes'] / 1024:.0f} KB, {fsm['dirty']} unsaved)"
+            )
         await callback.message.answer("\n".join(msg), parse_mode=None)
         await callback.answer()
     except Exception as e:
@@ -138,49 +147,51 @@ async def remove_type_callback(callback: CallbackQuery, state: FSMContext):
 @admin_router.message(AdminStates.add_source)
 async def save_source_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.add_source(message.text.strip())
+    await async_database.add_source(message.text.strip())
     await message.answer("✅ Source added")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.remove_source)
 async def confirm_del_source_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.del_source(message.text.strip())
+    await async_database.del_source(message.text.strip())
     await message.answer("✅ Source removed")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.set_target)
 async def save_target_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.set_target_chat(message.text.strip())
+    await async_database.set_target_chat(message.text.strip())
+    # Queued posts go to the new target from now on
+    scheduler.wake()
     await message.answer("✅ Target set")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.add_spam_keyword)
 async def save_keyword_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.add_spam_keyword(message.text.strip())
+    await async_database.add_spam_keyword(message.text.strip())
     await message.answer("✅ Keyword added")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.remove_spam_keyword)
 async def confirm_remove_keyword_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.del_spam_keyword(message.text.strip())
+    await async_database.del_spam_keyword(message.text.strip())
     await message.answer("✅ Keyword removed")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.add_spam_type)
 async def save_type_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.add_spam_type(message.text.strip().lower())
+    await async_database.add_spam_type(message.text.strip().lower())
     await message.answer("✅ Type added")
     await show_main_menu(message, state)
 
 @admin_router.message(AdminStates.remove_spam_type)
 async def confirm_remove_type_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
-    database.del_spam_type(message.text.strip().lower())
+    await async_database.del_spam_type(message.text.strip().lower())
     await message.answer("✅ Type removed")
     await show_main_menu(message, state)
 
@@ -190,14 +201,14 @@ async def confirm_remove_type_state(message: Message, state: FSMContext):
 async def enable_ai_callback(callback: CallbackQuery):
     if not await is_admin(callback.from_user.id):
         return await callback.answer("🚫 Access denied.", show_alert=True)
-    database.enable_ai()
+    await async_database.enable_ai()
     await callback.answer("✅ AI Enabled", show_alert=True)
 
 @admin_router.callback_query(F.data == "admin:disable_ai")
 async def disable_ai_callback(callback: CallbackQuery):
     if not await is_admin(callback.from_user.id):
         return await callback.answer("🚫 Access denied.", show_alert=True)
-    database.disable_ai()
+    await async_database.disable_ai()
     await callback.answer("✅ AI Disabled", show_alert=True)
 
 @admin_router.callback_query(F.data == "admin:restart")
@@ -230,7 +241,7 @@ async def save_model_state(message: Message, state: FSMContext):
     if not await is_admin(message.from_user.id): return
     model_key = message.text.strip()
     if model_key in config.AI_MODELS:
-        database.set_ai_model(config.AI_MODELS[model_key])
+        await async_database.set_ai_model(config.AI_MODELS[model_key])
         await message.answer(f"✅ Model set to {model_key}")
     else:
         await message.answer("❌ Unknown model")
@@ -251,17 +262,16 @@ async def run_prompt_state(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("⏳ Running prompt...")
     try:
-        openai.api_key = config.OPENAI_API_KEY
-        model = database.get_ai_status()['model']
-        r = await openai.chat.completions.create(
-            model=model,
-            messages=[
+        model = (await async_database.get_ai_status())['model']
+        reply = await ai_client.chat(
+            model,
+            [
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": message.text.strip()},
             ],
             timeout=120.0,
         )
-        await message.answer(r.choices[0].message.content)
+        await message.answer(reply)
     except Exception as e:
         logger.exception("Prompt failed")
         await message.answer(f"❌ Prompt failed: {e}")
@@ -3,21 +3,22 @@ from aiogram import Router, F, Bot
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from config import config
-import database
+import async_database
 from keyboards import main_menu, cancel_keyboard
 from handlers.state_groups import Conversation # Import Conversation state
-import openai
+from services import ai_client
+from services.pro_status import pro_status
+from services.rate_limiter import rate_limiter
+from services.chat_context import ConversationContext
+from services.stream_reply import StreamingReply
 import httpx
 import subprocess
-from models.pro_users import load_pro_users
 
 ai_router = Router()
 logger = logging.getLogger(__name__)
 
-# Define the daily request limit for free users
-FREE_TIER_LIMIT = 5
-# Define the maximum number of messages to keep in history
-CONVERSATION_HISTORY_LIMIT = 10
+# Prompts are trimmed to a token budget; older turns fold into a summary
+conversation = ConversationContext()
 
 def admin_only(handler):
     async def wrapper(message: Message, *args, **kwargs):
@@ -37,13 +38,13 @@ async def clear_conversation_history(message: Message, state: FSMContext):
 @ai_router.message(F.text == "🟢 Enable AI")
 @admin_only
 async def enable_ai(message: Message):
-    database.enable_ai()
+    await async_database.enable_ai()
     await message.answer("✅ AI Enabled")
 
 @ai_router.message(F.text == "🔴 Disable AI")
 @admin_only
 async def disable_ai(message: Message):
-    database.disable_ai()
+    await async_database.disable_ai()
     await message.answer("✅ AI Disabled")
 
 # === Set AI Model (Admin) ===
@@ -61,7 +62,7 @@ async def disable_ai(message: Message):
 async def handle_text_message(message: Message, state: FSMContext, bot: Bot):
     """Handle all text messages for AI conversation."""
     user_id = message.from_user.id
-    ai_status = database.get_ai_status()
+    ai_status = await async_database.get_ai_status()
 
     # 1. Check if AI is enabled globally
     if not ai_status or not ai_status['enabled']:
@@ -74,58 +75,59 @@ async def handle_text_message(message: Message, state: FSMContext, bot: Bot):
             return
 
     # 3. Check user's tier and limits
-    pro_users = load_pro_users()
-    is_pro = str(user_id) in pro_users and pro_users[str(user_id)].active
+    pro_user = await pro_status.get_active(user_id)
+    is_pro = pro_user is not None
 
-    if not is_pro:
-        request_count = database.check_and_update_user(user_id)
-        if request_count >= FREE_TIER_LIMIT:
-            await message.answer("ℹ️ You have reached your daily limit of free requests.\nUpgrade to PRO for unlimited access.")
-            return
+    # Reserves a request in memory; counts reach the database in batches
+    tier = 'pro' if is_pro else 'free'
+    if not await rate_limiter.try_acquire(user_id, tier):
+        await message.answer("ℹ️ You have reached your daily limit of free requests.\nUpgrade to PRO for unlimited access.")
+        return
 
     # 4. Determine which model to use
     model_to_use = ai_status['model']
     if is_pro:
-        user_pro_settings = pro_users[str(user_id)]
-        if not user_pro_settings.ai_enabled:
+        if not pro_user.ai_enabled:
+            rate_limiter.release(user_id, tier)
             return
-        model_to_use = user_pro_settings.ai_model
+        model_to_use = pro_user.ai_model
 
     # 5. Process the prompt with conversation history
+    reply = None
     try:
         await bot.send_chat_action(message.chat.id, 'typing')
-        openai.api_key = config.OPENAI_API_KEY
 
         # Get history from state
         history = await state.get_data()
-        messages = history.get("messages", [])
-
-        # Add the new user message
-        messages.append({"role": "user", "content": message.text.strip()})
-
-        # Ensure history does not exceed the limit
-        if len(messages) > CONVERSATION_HISTORY_LIMIT:
-            messages = messages[-CONVERSATION_HISTORY_LIMIT:]
-
-        # System prompt can be the first message if history is empty
-        if not any(m['role'] == 'system' for m in messages):
-            messages.insert(0, {"role": "system", "content": "You are a helpful assistant."})
-
-        r = openai.chat.completions.create(
-            model=model_to_use,
-            messages=messages
+        user_turn = {"role": "user", "content": message.text.strip()}
+        payload = conversation.build(
+            model_to_use, history.get("messages", []) + [user_turn], history.get("summary")
         )
-        response_text = r.choices[0].message.content
 
-        # Add AI response to history
-        messages.append({"role": "assistant", "content": response_text})
+        if config.AI_STREAM_REPLIES:
+            # Show the answer as it is generated instead of after the last token
+            reply = StreamingReply(message)
+            await reply.start()
+            async for delta in ai_client.stream(model_to_use, payload):
+                await reply.feed(delta)
+            response_text = await reply.finish()
+        else:
+            response_text = await ai_client.chat(model_to_use, payload)
+            await message.answer(response_text)
+
+        # Add both turns to the history as it is now; a summary may have
+        # folded older turns away while we waited for the reply
+        history = await state.get_data()
+        messages = history.get("messages", []) + [user_turn, {"role": "assistant", "content": response_text}]
         await state.update_data(messages=messages)
-
-        await message.answer(response_text)
-
-        if not is_pro:
-            database.increment_request_count(user_id)
+        conversation.maybe_fold(state, model_to_use, messages)
 
     except Exception as e:
+        # Failed requests don't count against the quota
+        rate_limiter.release(user_id, tier)
         logger.error(f"Error processing AI prompt for user {user_id} with model {model_to_use}: {e}")
-        await message.answer("❌ An error occurred while processing your request. Please try again later.")
+        notice = "❌ An error occurred while processing your request. Please try again later."
+        if reply:
+            await reply.abort(notice)
+        else:
+            await message.answer(notice)
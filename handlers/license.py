@@ -1,4 +1,3 @@
-import sqlite3
 import secrets
 from datetime import datetime, timedelta
 import csv
@@ -7,44 +6,27 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, FSInputFile, ReplyKeyboardMarkup, KeyboardButton
 from config import config
-from models.pro_users import ProUser, save_pro_user, load_pro_user, load_pro_users
+import database
+from models.pro_users import ProUser, save_pro_user, load_pro_user, load_pro_users, delete_pro_user, get_pro_user_stats, get_expiring_pro_users
 
 license_router = Router()
 EXPORT_FILE = Path("data/pro_users_export.csv")
 
 def get_db_connection():
-    return sqlite3.connect(config.DATABASE_NAME)
+    return database.get_connection()
 
 # License DB functions
 def add_license(license_key: str, duration_days: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO licenses (license_key, duration_days) VALUES (?, ?)", (license_key, duration_days))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO licenses (license_key, duration_days) VALUES (?, ?)", (license_key, duration_days))
 
 def get_license(license_key: str) -> tuple | None:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT duration_days FROM licenses WHERE license_key = ?", (license_key,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
+    cursor = get_db_connection().execute("SELECT duration_days FROM licenses WHERE license_key = ?", (license_key,))
+    return cursor.fetchone()
 
 def delete_license(license_key: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM licenses WHERE license_key = ?", (license_key,))
-    conn.commit()
-    conn.close()
-
-# Pro User DB functions
-def delete_pro_user(user_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM pro_users WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM licenses WHERE license_key = ?", (license_key,))
 
 @license_router.message(Command("admin_menu"))
 async def show_admin_menu(message: Message):
@@ -167,29 +149,20 @@ async def stats_pro(message: Message):
         await message.answer("🚫 Access denied.")
         return
 
-    pro_users = load_pro_users()
     today = datetime.utcnow().date()
-    total = len(pro_users)
-    active = 0
-    expired = 0
-    expiring_soon = 0
-
-    for user in pro_users.values():
-        expiry_date = datetime.strptime(user.expires_at, "%Y-%m-%d").date()
-        if expiry_date >= today:
-            active += 1
-            if (expiry_date - today).days <= 7:
-                expiring_soon += 1
-        else:
-            expired += 1
+    start, end = today.strftime("%Y-%m-%d"), (today + timedelta(days=7)).strftime("%Y-%m-%d")
+    stats = get_pro_user_stats(start, end)
 
     msg = (
         f"📊 PRO Subscription Stats:\n"
-        f"• Total PRO users: {total}\n"
-        f"• ✅ Active: {active}\n"
-        f"• ⏳ Expiring in ≤7 days: {expiring_soon}\n"
-        f"• ❌ Expired: {expired}"
+        f"• Total PRO users: {stats['total']}\n"
+        f"• ✅ Active: {stats['active']}\n"
+        f"• ⏳ Expiring in ≤7 days: {stats['expiring_soon']}\n"
+        f"• ❌ Expired: {stats['expired']}"
     )
+    expiring = get_expiring_pro_users(start, end)
+    if expiring:
+        msg += "\n\n⏳ Expiring this week:\n" + "\n".join(f"👤 {user_id} — {expires_at}" for user_id, expires_at in expiring)
     await message.answer(msg)
 
 @license_router.message(Command("export_pro"))
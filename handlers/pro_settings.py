@@ -6,7 +6,7 @@ from aiogram.fsm.context import FSMContext
 from models.pro_users import load_pro_user, save_pro_user
 from keyboards import model_selection_keyboard, pro_user_menu_keyboard, cancel_keyboard
 from config import config
-from datetime import datetime
+from services.pro_status import pro_status
 
 pro_router = Router()
 
@@ -18,12 +18,9 @@ class ProStates(StatesGroup):
     set_media_types = State()
     set_ai_model = State()
 
-def is_pro_user(user_id: int) -> bool:
-    pro_user = load_pro_user(user_id)
-    if not pro_user:
-        return False
-    # Also check if the subscription is active
-    return pro_user.active and datetime.strptime(pro_user.expires_at, "%Y-%m-%d").date() >= datetime.utcnow().date()
+async def is_pro_user(user_id: int) -> bool:
+    # Cached lookup; also checks that the subscription is active and unexpired
+    return await pro_status.is_pro(user_id)
 
 @pro_router.message(F.text == "◀️ Cancel", ProStates)
 async def cancel_pro_handler(message: Message, state: FSMContext):
@@ -32,14 +29,14 @@ async def cancel_pro_handler(message: Message, state: FSMContext):
 
 @pro_router.message(Command("pro"))
 async def pro_menu(message: Message):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         await message.answer("❌ You are not a PRO user. Use /activate_license or /buy_pro.")
         return
     await message.answer("💎 *PRO Menu*", reply_markup=pro_user_menu_keyboard())
 
 @pro_router.message(Command("set_target"))
 async def start_set_target(message: Message, state: FSMContext):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         return
     await state.set_state(ProStates.set_target)
     await message.answer("📥 Send your target channel username (e.g. @mychannel):", reply_markup=cancel_keyboard())
@@ -59,7 +56,7 @@ async def save_target_channel(message: Message, state: FSMContext):
 # Example for a setting: AI Status
 @pro_router.message(Command("ai_status"))
 async def ai_status(message: Message):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         return
     pro_user = load_pro_user(message.from_user.id)
     if not pro_user:
@@ -71,7 +68,7 @@ async def ai_status(message: Message):
 
 @pro_router.message(Command("enable_ai"))
 async def enable_ai(message: Message):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         return
     pro_user = load_pro_user(message.from_user.id)
     if not pro_user:
@@ -82,7 +79,7 @@ async def enable_ai(message: Message):
 
 @pro_router.message(Command("disable_ai"))
 async def disable_ai(message: Message):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         return
     pro_user = load_pro_user(message.from_user.id)
     if not pro_user:
@@ -93,7 +90,7 @@ async def disable_ai(message: Message):
 
 @pro_router.message(Command("set_ai_model"))
 async def start_set_ai_model(message: Message, state: FSMContext):
-    if not is_pro_user(message.from_user.id):
+    if not await is_pro_user(message.from_user.id):
         return
     await state.set_state(ProStates.set_ai_model)
     await message.answer("🤖 Choose your preferred AI model:", reply_markup=model_selection_keyboard())
@@ -1,5 +1,6 @@
 import sqlite3
 from config import Config
+from db_migration import migrate
 
 conn = sqlite3.connect(Config.DATABASE_NAME)
 cursor = conn.cursor()
@@ -89,3 +90,6 @@ CREATE TABLE IF NOT EXISTS post_queue (
 
 conn.commit()
 conn.close()
+
+# Apply the versioned migrations on top of the base schema
+migrate()
@@ -3,13 +3,16 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import config
+from db_migration import migrate
 from handlers.admin import admin_router
 from handlers.ai import ai_router
 from handlers.license import license_router
 from handlers.pro_settings import pro_router
+from services.chat_context import load_encodings
+from services.fsm_storage import SQLiteLRUStorage
+from services.rate_limiter import rate_limiter
 
 # Set up logging
 logging.basicConfig(
@@ -20,7 +23,9 @@ logger = logging.getLogger(__name__)
 
 # Bot and dispatcher setup
 bot = Bot(token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+# Conversation state: hot chats in memory, the rest compressed in SQLite
+storage = SQLiteLRUStorage()
+dp = Dispatcher(storage=storage)
 
 # Register all routers
 def register_routers(dispatcher: Dispatcher):
@@ -33,12 +38,20 @@ from scheduler import run_scheduler
 
 async def main():
     print("🚀 Bot is starting...")
+    migrate()
     register_routers(dp)
+    await load_encodings([*config.AI_MODELS.values(), config.CHAT_SUMMARY_MODEL])
 
     # Start the scheduler as a background task
     asyncio.create_task(run_scheduler())
+    # Write-behind flushing of free-tier usage counters and FSM state
+    asyncio.create_task(rate_limiter.run())
+    storage.start()
 
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await rate_limiter.flush()
 
 if __name__ == "__main__":
     try:
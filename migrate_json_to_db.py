@@ -1,6 +1,7 @@
 import json
 import sqlite3
 from pathlib import Path
+from models.pro_users import ProUser, save_pro_user
 
 # Database and JSON file paths
 DB_FILE = "userbot.db"
@@ -20,22 +21,18 @@ def migrate_data():
         with open(PRO_USERS_FILE, "r") as f:
             pro_users_data = json.load(f)
 
+        # List settings live in child tables now, so go through the model
         for user_id, data in pro_users_data.items():
-            cursor.execute("""
-                INSERT OR REPLACE INTO pro_users (
-                    user_id, expires_at, target_channel, source_channels,
-                    filters, media_types, active, ai_enabled, ai_model
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                int(user_id),
-                data.get("expires_at"),
-                data.get("target_channel"),
-                json.dumps(data.get("source_channels", [])),
-                json.dumps(data.get("filters", [])),
-                json.dumps(data.get("media_types", [])),
-                data.get("active", True),
-                data.get("ai_enabled", True),
-                data.get("ai_model", "GPT-3.5 Turbo")
+            save_pro_user(ProUser(
+                telegram_id=int(user_id),
+                expires_at=data.get("expires_at"),
+                target_channel=data.get("target_channel"),
+                source_channels=data.get("source_channels", []),
+                filters=data.get("filters", []),
+                media_types=data.get("media_types", []),
+                active=data.get("active", True),
+                ai_enabled=data.get("ai_enabled", True),
+                ai_model=data.get("ai_model", "GPT-3.5 Turbo")
             ))
         print(f"Successfully migrated {len(pro_users_data)} users from {PRO_USERS_FILE}.")
     else:
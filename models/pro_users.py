@@ -1,7 +1,6 @@
-import sqlite3
+from typing import Iterable, Optional, List, Dict, Tuple
 import json
-from typing import Optional, List, Dict
-from config import Config
+import database
 
 class ProUser:
     def __init__(self, telegram_id: int, expires_at: str, target_channel: Optional[str] = None,
@@ -19,68 +18,125 @@ class ProUser:
         self.ai_model = ai_model
 
 def get_db_connection():
-    return sqlite3.connect(Config.DATABASE_NAME)
+    return database.get_connection()
 
-def load_pro_users() -> Dict[str, ProUser]:
+# Called as callback(user_id, user) after every committed write, with None
+# for a deleted user, so caches can be updated without waiting for a TTL
+_listeners = []
+
+def on_change(callback):
+    _listeners.append(callback)
+
+def _notify(user_id: int, user: Optional[ProUser]):
+    for callback in _listeners:
+        callback(user_id, user)
+
+_COLUMNS = "user_id, expires_at, target_channel, active, ai_enabled, ai_model"
+
+# List settings live in child tables, one row per item in list order:
+# (ProUser attribute, table, value column)
+_CHILDREN = (
+    ('source_channels', 'pro_user_sources', 'channel'),
+    ('filters', 'pro_user_filters', 'keyword'),
+    ('media_types', 'pro_user_media_types', 'media_type'),
+)
+
+def _read_users(where: str = "", params: tuple = ()) -> List[ProUser]:
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pro_users")
-    users = {}
-    for row in cursor.fetchall():
-        user_id, expires_at, target_channel, source_channels, filters, media_types, active, ai_enabled, ai_model = row
-        users[str(user_id)] = ProUser(
-            telegram_id=user_id,
-            expires_at=expires_at,
-            target_channel=target_channel,
-            source_channels=json.loads(source_channels) if source_channels else [],
-            filters=json.loads(filters) if filters else [],
-            media_types=json.loads(media_types) if media_types else [],
-            active=bool(active),
-            ai_enabled=bool(ai_enabled),
-            ai_model=ai_model
-        )
-    conn.close()
-    return users
+    # One read transaction so parent and child rows come from the same write
+    conn.execute("BEGIN")
+    try:
+        users = {}
+        for row in conn.execute(f"SELECT {_COLUMNS} FROM pro_users {where}", params):
+            user_id, expires_at, target_channel, active, ai_enabled, ai_model = row
+            users[user_id] = ProUser(
+                telegram_id=user_id,
+                expires_at=expires_at,
+                target_channel=target_channel,
+                active=bool(active),
+                ai_enabled=bool(ai_enabled),
+                ai_model=ai_model
+            )
+        for attr, table, column in _CHILDREN:
+            cursor = conn.execute(f"SELECT user_id, {column} FROM {table} {where} ORDER BY user_id, position", params)
+            for user_id, value in cursor:
+                if user_id in users:
+                    getattr(users[user_id], attr).append(value)
+        return list(users.values())
+    finally:
+        conn.commit()
+
+def load_pro_users() -> Dict[str, ProUser]:
+    return {str(user.telegram_id): user for user in _read_users()}
 
 def save_pro_user(user: ProUser):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR REPLACE INTO pro_users (
-            user_id, expires_at, target_channel, source_channels,
-            filters, media_types, active, ai_enabled, ai_model
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        user.telegram_id,
-        user.expires_at,
-        user.target_channel,
-        json.dumps(user.source_channels),
-        json.dumps(user.filters),
-        json.dumps(user.media_types),
-        user.active,
-        user.ai_enabled,
-        user.ai_model
-    ))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        # Every write gets a fresh revision so the userbot's routing index
+        # can reload just the users that changed
+        database.bump_config_version(conn, 'pro_users')
+        conn.execute(f"""
+            INSERT INTO pro_users ({_COLUMNS}, revision)
+            VALUES (?, ?, ?, ?, ?, ?, (SELECT version FROM config_version WHERE scope = 'pro_users'))
+            ON CONFLICT(user_id) DO UPDATE SET
+                expires_at = excluded.expires_at,
+                target_channel = excluded.target_channel,
+                active = excluded.active,
+                ai_enabled = excluded.ai_enabled,
+                ai_model = excluded.ai_model,
+                revision = excluded.revision
+        """, (
+            user.telegram_id,
+            user.expires_at,
+            user.target_channel,
+            user.active,
+            user.ai_enabled,
+            user.ai_model
+        ))
+        for attr, table, column in _CHILDREN:
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user.telegram_id,))
+            conn.executemany(
+                f"INSERT INTO {table} (user_id, position, {column}) VALUES (?, ?, ?)",
+                [(user.telegram_id, position, value) for position, value in enumerate(getattr(user, attr))]
+            )
+    _notify(user.telegram_id, user)
+
+def delete_pro_user(user_id: int):
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM pro_users WHERE user_id = ?", (user_id,))
+        for _, table, _ in _CHILDREN:
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        database.bump_config_version(conn, 'pro_users')
+    _notify(user_id, None)
 
 def load_pro_user(user_id: int) -> Optional[ProUser]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pro_users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        user_id, expires_at, target_channel, source_channels, filters, media_types, active, ai_enabled, ai_model = row
-        return ProUser(
-            telegram_id=user_id,
-            expires_at=expires_at,
-            target_channel=target_channel,
-            source_channels=json.loads(source_channels) if source_channels else [],
-            filters=json.loads(filters) if filters else [],
-            media_types=json.loads(media_types) if media_types else [],
-            active=bool(active),
-            ai_enabled=bool(ai_enabled),
-            ai_model=ai_model
-        )
-    return None
+    users = _read_users("WHERE user_id = ?", (user_id,))
+    return users[0] if users else None
+
+def load_pro_users_by_id(user_ids: Iterable[int]) -> List[ProUser]:
+    """The given users in one read; IDs without a row are skipped."""
+    return _read_users("WHERE user_id IN (SELECT value FROM json_each(?))", (json.dumps(list(user_ids)),))
+
+def get_pro_user_revisions() -> Dict[int, int]:
+    """Maps every PRO user ID to the revision of its last write."""
+    return dict(get_db_connection().execute("SELECT user_id, revision FROM pro_users").fetchall())
+
+def get_expiring_pro_users(start: str, end: str) -> List[Tuple[int, str]]:
+    """(user_id, expires_at) of users expiring between two YYYY-MM-DD dates, inclusive."""
+    cursor = get_db_connection().execute(
+        "SELECT user_id, expires_at FROM pro_users WHERE expires_at BETWEEN ? AND ? ORDER BY expires_at",
+        (start, end)
+    )
+    return cursor.fetchall()
+
+def get_pro_user_stats(today: str, soon: str) -> Dict[str, int]:
+    """Counts users by expiry, with dates as YYYY-MM-DD strings."""
+    total, active, expiring_soon = get_db_connection().execute(
+        """
+        SELECT COUNT(*),
+               COALESCE(SUM(expires_at >= ?), 0),
+               COALESCE(SUM(expires_at BETWEEN ? AND ?), 0)
+        FROM pro_users
+        """,
+        (today, today, soon)
+    ).fetchone()
+    return {'total': total, 'active': active, 'expiring_soon': expiring_soon, 'expired': total - active}
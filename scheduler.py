@@ -1,62 +1,197 @@
 import asyncio
-import database
+import heapq
+import os
+import socket
+import time
+import uuid
+import async_database
 from pyrogram import Client
+from pyrogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
 from config import config
+from services.send_engine import SendEngine
+from services.telegram_session import PersistentClient
 
-# Use the same session as userbot.py to operate as the same user
-app = Client("userbot")
+# Operates as the same user as userbot.py, through its own session. It only
+# sends, so it doesn't subscribe to updates.
+if config.SCHEDULER_SESSION == config.USERBOT_SESSION:
+    raise RuntimeError(
+        f"SCHEDULER_SESSION and USERBOT_SESSION are both '{config.SCHEDULER_SESSION}'; "
+        "the scheduler and the userbot must not share a session"
+    )
+app = Client(config.SCHEDULER_SESSION, config.API_ID, config.API_HASH, no_updates=True)
 
-async def run_scheduler():
+# Longest the scheduler sleeps before checking whether the queue or the
+# target changed (a single-row lookup, not a queue scan). Changes made in
+# this process call `wake()`; the poll only catches the userbot's writes,
+# which are scheduled at least SLOT_INITIAL_DELAY_MINUTES ahead anyway.
+VERSION_POLL_INTERVAL = 30
+# How many upcoming posts are kept in the in-memory heap
+UPCOMING_WINDOW = 100
+# Seconds before a post that failed to send is retried
+RETRY_DELAY = 60
+# Posts leased per claim, and how long a lease lasts before another
+# scheduler may take the post over
+CLAIM_BATCH = 20
+LEASE_SECONDS = 300
+
+ALBUM_MEDIA_TYPES = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'audio': InputMediaAudio,
+}
+
+class PostScheduler:
     """
-    Checks the database for due posts and sends them to the target channel.
-    Runs in a continuous loop.
+    Sends queued posts when they fall due.
+
+    Upcoming `scheduled_for` times sit in a min-heap, and the loop sleeps
+    until the earliest one. Writers in this process wake it with `wake()`;
+    changes from other processes are noticed by polling the 'queue'/'config'
+    version stamps every VERSION_POLL_INTERVAL seconds.
+
+    Due posts are leased in bounded batches, so several schedulers can share
+    one queue without sending a post twice, and handed to a `SendEngine`
+    that paces them per destination and honours FloodWait delays.
     """
-    print("⏰ Scheduler started, will check for due posts every minute.")
-    while True:
-        try:
-            # We need to get the target channel inside the loop
-            # in case it's changed in the admin panel.
-            target_channel = database.get_target_chat()
-            if not target_channel:
-                # print("Scheduler: No target channel set. Waiting...")
-                await asyncio.sleep(60)
-                continue
 
-            due_posts = database.get_due_posts()
+    def __init__(self, client: Client = app):
+        # One connection for the scheduler's lifetime, reconnected on failure
+        self.session = PersistentClient(client)
+        # Rate-limited, FloodWait-aware sends, concurrent across destinations
+        self.engine = SendEngine(self._send_post, self._send_failed, self._send_deferred)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.target_channel = None
+        self._heap = []
+        self._versions = None
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Re-check the queue now instead of at the next due time."""
+        self._versions = None
+        self._wake.set()
+
+    async def run(self):
+        print("⏰ Scheduler started, sleeping until the next due post.")
+        await self.session.ensure_connected()
+        while True:
+            delay = VERSION_POLL_INTERVAL
+            # Cleared before the work, so a wake() that arrives during it is not lost
+            self._wake.clear()
+            try:
+                await self._reload_if_changed()
+                now = time.time()
+                if self._heap:
+                    if self._heap[0][0] <= now:
+                        if await self._send_due():
+                            continue
+                        # Another scheduler got there first; don't spin on it
+                        delay = 1
+                    else:
+                        delay = min(delay, self._heap[0][0] - now)
+            except Exception as e:
+                print(f"An error occurred in the scheduler loop: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _reload_if_changed(self):
+        versions = await async_database.get_config_versions(('config', 'queue'))
+        if versions == self._versions:
+            return
+        self._versions = versions
+        # The target may have been changed in the admin panel
+        self.target_channel = await async_database.get_target_chat()
+        upcoming = await async_database.get_upcoming_posts(UPCOMING_WINDOW)
+        self._heap = [(due_at, post_id) for post_id, due_at in upcoming]
+        heapq.heapify(self._heap)
+
+    async def _send_due(self) -> int:
+        """Claims and sends due posts batch by batch; returns how many were claimed."""
+        claimed = 0
+        while True:
+            due_posts = await async_database.claim_due_posts(self.owner, CLAIM_BATCH, LEASE_SECONDS)
             if due_posts:
-                print(f"📬 Found {len(due_posts)} posts to send.")
-
-            async with app:
-                for post in due_posts:
-                    post_id, content_type, file_id, caption = post
-                    try:
-                        print(f"  -> Sending post {post_id} of type '{content_type}'...")
-                        if content_type == 'text':
-                            await app.send_message(target_channel, caption)
-                        elif content_type == 'photo':
-                            await app.send_photo(target_channel, file_id, caption=caption)
-                        elif content_type == 'video':
-                            await app.send_video(target_channel, file_id, caption=caption)
-                        elif content_type == 'document':
-                            await app.send_document(target_channel, file_id, caption=caption)
-                        elif content_type == 'audio':
-                            await app.send_audio(target_channel, file_id, caption=caption)
-                        elif content_type == 'voice':
-                            await app.send_voice(target_channel, file_id, caption=caption)
-                        elif content_type == 'sticker':
-                            await app.send_sticker(target_channel, file_id)
-
-                        # If sending was successful, remove from queue
-                        database.remove_from_queue(post_id)
-                        print(f"  ✅ Post {post_id} sent and removed from queue.")
-
-                    except Exception as e:
-                        print(f"  ❌ Error sending post {post_id}: {e}")
-                        # Optionally, you could add logic here to handle failed posts,
-                        # e.g., mark them as failed instead of deleting. For now, we just log it.
-
-        except Exception as e:
-            print(f"An error occurred in the scheduler loop: {e}")
-
-        # Wait for 60 seconds before the next check
-        await asyncio.sleep(60)
+                print(f"📬 Claimed {len(due_posts)} posts to send.")
+                claimed += len(due_posts)
+                await self._send(due_posts)
+            if len(due_posts) < CLAIM_BATCH:
+                break
+        # Reload so retries and newly ready posts are placed correctly
+        self._versions = None
+        return claimed
+
+    async def _send(self, due_posts):
+        await self.session.ensure_connected()
+        # PRO fan-out rows name their own target; the rest go to the global one
+        by_target = {}
+        for post in due_posts:
+            by_target.setdefault(post[5] or self.target_channel, []).append(post)
+
+        jobs = []
+        for target, posts in by_target.items():
+            try:
+                if not target:
+                    raise ValueError("no target channel is set")
+                target_channel = await self.session.resolve(target)
+            except Exception as e:
+                print(f"  ❌ Could not resolve target {target}: {e}")
+                self.session.mark_failed(e)
+                for post in posts:
+                    await async_database.release_post(post[0], self.owner, int(time.time()) + RETRY_DELAY)
+                continue
+            jobs.extend((target_channel, (target_channel, post)) for post in posts)
+        await self.engine.dispatch(jobs)
+
+    async def _send_post(self, job):
+        target_channel, (post_id, content_type, file_id, caption, media, _) = job
+        client = self.session.client
+        print(f"  -> Sending post {post_id} of type '{content_type}'...")
+        if content_type == 'album':
+            # The whole album goes out in one request, captioned on its first item
+            await client.send_media_group(target_channel, [
+                ALBUM_MEDIA_TYPES[item_type](item_file_id, caption=caption if i == 0 else "")
+                for i, (item_type, item_file_id) in enumerate(media)
+            ])
+        elif content_type == 'text':
+            await client.send_message(target_channel, caption)
+        elif content_type == 'photo':
+            await client.send_photo(target_channel, file_id, caption=caption)
+        elif content_type == 'video':
+            await client.send_video(target_channel, file_id, caption=caption)
+        elif content_type == 'document':
+            await client.send_document(target_channel, file_id, caption=caption)
+        elif content_type == 'audio':
+            await client.send_audio(target_channel, file_id, caption=caption)
+        elif content_type == 'voice':
+            await client.send_voice(target_channel, file_id, caption=caption)
+        elif content_type == 'sticker':
+            await client.send_sticker(target_channel, file_id)
+        self.session.mark_ok()
+
+        # If sending was successful, remove from queue
+        await async_database.complete_post(post_id, self.owner)
+        print(f"  ✅ Post {post_id} sent and removed from queue.")
+
+    async def _send_failed(self, job, error: Exception):
+        post_id = job[1][0]
+        print(f"  ❌ Error sending post {post_id}: {error}")
+        self.session.mark_failed(error)
+        # Give it back to the queue and try again after a pause
+        await async_database.release_post(post_id, self.owner, int(time.time()) + RETRY_DELAY)
+
+    async def _send_deferred(self, job, retry_at: float):
+        post_id = job[1][0]
+        print(f"  ⏳ Post {post_id} deferred by a FloodWait until {time.ctime(retry_at)}.")
+        await async_database.release_post(post_id, self.owner, int(retry_at) + 1)
+
+scheduler = PostScheduler()
+
+async def run_scheduler():
+    """
+    Sends due posts to the target channel.
+    Runs until cancelled.
+    """
+    await scheduler.run()
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import async_database
+import database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Run disk eviction after this many writes
+EVICT_EVERY = 200
+# Write the recorded last-use times of this many hit entries in one batch
+TOUCH_BATCH = 200
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Whitespace and Unicode-form differences shouldn't cause a cache miss."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+def make_key(kind: str, content: str, model: str, prompt_version: int, variant: str = "") -> str:
+    """
+    Content-addressed key: same input, model and prompt -> same result.
+    `variant` covers anything else the prompt is built from, like the tag.
+    """
+    raw = "\x1f".join((kind, model or "", str(prompt_version), variant or "", content))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache for AI results: an in-memory LRU in front of the
+    `ai_cache` table, which has a TTL and is trimmed to a maximum row count.
+    Concurrent misses on one key share a single producer call. Hits don't
+    write to the table; their last-use times are saved in batches, and
+    always before the table is trimmed.
+    """
+
+    def __init__(self, memory_size: int = Config.AI_CACHE_MEMORY_SIZE,
+                 ttl: int = Config.AI_CACHE_TTL_HOURS * 3600,
+                 max_rows: int = Config.AI_CACHE_MAX_ROWS):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._writes = 0
+        self._inflight = {}  # key -> Future of the running producer
+        self._touched = {}  # key -> last hit, not yet written
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    async def get(self, key: str) -> Optional[str]:
+        now = int(time.time())
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                await self._touch(key, now)
+                return value
+            del self._memory[key]
+
+        try:
+            row = await async_database.run(database.get_cached_result, key, now)
+        except Exception as e:
+            logger.error(f"AI cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        value, expires_at = row
+        self.disk_hits += 1
+        # Keep the row's own expiry; a hit doesn't extend its life
+        self._remember(key, value, expires_at)
+        await self._touch(key, now)
+        return value
+
+    async def put(self, key: str, value: str):
+        now = int(time.time())
+        self._remember(key, value, now + self.ttl)
+        try:
+            await async_database.run(database.put_cached_result, key, value, now, self.ttl)
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                # Eviction goes by last use, so record recent hits first
+                await self._flush_touched()
+                removed = await async_database.run(database.evict_cached_results, now, self.max_rows)
+                if removed:
+                    logger.info(f"AI cache evicted {removed} entries")
+        except Exception as e:
+            logger.error(f"AI cache write failed: {e}")
+
+    async def get_or_create(self, key: str, producer: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Returns the cached value, or awaits `producer()` and caches a non-empty result."""
+        if key in self._inflight:
+            self.memory_hits += 1
+            return await asyncio.shield(self._inflight[key])
+        value = await self.get(key)
+        if value is not None:
+            return value
+        if key in self._inflight:
+            # Another caller started producing while we checked the disk tier
+            self.memory_hits += 1
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        started = time.monotonic()
+        value = None
+        try:
+            value = await producer()
+        finally:
+            # Waiters get None if the producer failed, like a failed call would return
+            del self._inflight[key]
+            future.set_result(value)
+        self.miss_seconds += time.monotonic() - started
+        if value:
+            await self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            'hits': hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            # Every hit is an API call we didn't make, at the average miss latency
+            'saved_seconds': hits * avg_miss,
+        }
+
+    async def _touch(self, key: str, now: int):
+        self._touched[key] = now
+        if len(self._touched) >= TOUCH_BATCH:
+            await self._flush_touched()
+
+    async def _flush_touched(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        try:
+            await async_database.run(
+                database.touch_cached_results, [(used_at, key) for key, used_at in touched.items()]
+            )
+        except Exception as e:
+            # Only the eviction order suffers; not worth retrying
+            logger.error(f"AI cache last-use update failed: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: int):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import openai
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# One client per process: its HTTP pool keeps connections to the API alive
+_client: Optional[openai.AsyncOpenAI] = None
+_global_limit: Optional[asyncio.Semaphore] = None
+_model_limits: Dict[str, asyncio.Semaphore] = {}
+
+def get_client() -> openai.AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            timeout=Config.AI_TIMEOUT,
+            max_retries=Config.AI_MAX_RETRIES,
+        )
+    return _client
+
+def _limits(model: str):
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(Config.AI_MAX_CONCURRENCY)
+    limit = _model_limits.get(model)
+    if limit is None:
+        limit = asyncio.Semaphore(
+            Config.AI_MODEL_CONCURRENCY.get(model, Config.AI_MODEL_CONCURRENCY_DEFAULT)
+        )
+        _model_limits[model] = limit
+    return _global_limit, limit
+
+async def complete(model: str, messages: List[dict], timeout: Optional[float] = None, **kwargs):
+    """
+    Runs a chat completion without blocking the event loop and returns the
+    raw response. Waits for a free slot in both the global and the per-model
+    concurrency limit first.
+    """
+    global_limit, model_limit = _limits(model)
+    async with model_limit, global_limit:
+        return await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or Config.AI_TIMEOUT,
+            **kwargs
+        )
+
+async def chat(model: str, messages: List[dict], timeout: Optional[float] = None, **kwargs) -> str:
+    """Like `complete`, but returns just the reply text."""
+    response = await complete(model, messages, timeout=timeout, **kwargs)
+    return response.choices[0].message.content
+
+async def stream(model: str, messages: List[dict], timeout: Optional[float] = None, **kwargs):
+    """
+    Like `chat`, but yields the reply text in pieces as they are generated.
+    The concurrency slots are held until the stream is consumed or closed.
+    """
+    global_limit, model_limit = _limits(model)
+    async with model_limit, global_limit:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or Config.AI_TIMEOUT,
+            stream=True,
+            **kwargs
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
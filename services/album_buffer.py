@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Telegram albums hold at most this many items
+MAX_ALBUM_SIZE = 10
+
+class AlbumBuffer:
+    """
+    Collects the messages of a media group before they are ingested.
+
+    Pyrogram delivers every album item as its own update. Items are held per
+    (chat, media_group_id) until no new one has arrived for `window`
+    seconds, or the album is full, and `on_album(messages)` is then called
+    once with the items in message order.
+    """
+
+    def __init__(self, on_album: Callable[[List], Awaitable[None]],
+                 window: float = Config.ALBUM_WINDOW_SECONDS):
+        self.on_album = on_album
+        self.window = window
+        self._pending: Dict[Tuple[int, str], List] = {}
+        self._timers: Dict[Tuple[int, str], asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    def add(self, message):
+        key = (message.chat.id, message.media_group_id)
+        self._pending.setdefault(key, []).append(message)
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        if len(self._pending[key]) >= MAX_ALBUM_SIZE:
+            self._flush(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+    def _flush(self, key):
+        self._timers.pop(key, None)
+        messages = self._pending.pop(key, None)
+        if not messages:
+            return
+        messages.sort(key=lambda message: message.id)
+        task = asyncio.create_task(self._deliver(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, messages):
+        try:
+            await self.on_album(messages)
+        except Exception as e:
+            logger.error(f"Failed to ingest album {messages[0].media_group_id}: {e}")
@@ -0,0 +1,136 @@
+import asyncio
+import functools
+import logging
+from typing import List, Optional
+
+from config import Config
+from services import ai_client
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to an estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation between a user and an assistant. "
+    "Keep facts, names, decisions and open questions the assistant may need later; drop small talk. "
+    "Write it in the language of the conversation, in at most a few short paragraphs."
+)
+# Per-message framing tokens added by the chat format
+MESSAGE_OVERHEAD = 4
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The first load downloads the BPE file; if that fails, estimate rather than fail every call
+        logger.warning(f"Could not load the tokenizer for {model}, estimating tokens instead: {e}")
+        return None
+
+async def load_encodings(models):
+    """Loads the tokenizers of `models` in a thread, so a first-use download doesn't block the event loop."""
+    loop = asyncio.get_running_loop()
+    for model in set(models):
+        await loop.run_in_executor(None, _encoding, model)
+
+def count_tokens(model: str, text: str) -> int:
+    """Tokens in `text` for `model`; without tiktoken, a deliberately high estimate."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # ~4 bytes per token holds for English and overshoots for Cyrillic, which is the safe side
+    return len(text.encode("utf-8")) // 4 + 1
+
+def message_tokens(model: str, message: dict) -> int:
+    return count_tokens(model, message["content"]) + MESSAGE_OVERHEAD
+
+class ConversationContext:
+    """
+    Builds token-bounded prompts from a conversation stored in FSM data.
+
+    The data holds recent `messages` and a rolling `summary` of everything
+    older. `build()` sends the system prompt, the summary and as many of the
+    newest turns as fit into `budget` tokens. Once the stored turns exceed
+    the budget, `maybe_fold()` summarizes the oldest ones in a background
+    task, off the reply path, and keeps only the newest half of the budget
+    verbatim.
+    """
+
+    def __init__(self, budget: int = Config.CHAT_CONTEXT_TOKENS,
+                 summary_model: str = Config.CHAT_SUMMARY_MODEL,
+                 summary_tokens: int = Config.CHAT_SUMMARY_TOKENS):
+        self.budget = budget
+        self.summary_model = summary_model
+        self.summary_tokens = summary_tokens
+        self._folding = set()
+        self._tasks = set()
+
+    def build(self, model: str, messages: List[dict], summary: Optional[str] = None) -> List[dict]:
+        """The request payload: system prompt, summary and the newest turns within budget."""
+        head = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        remaining = self.budget - sum(message_tokens(model, m) for m in head)
+        turns = []
+        for message in reversed(messages):
+            cost = message_tokens(model, message)
+            # The newest message always goes in, even if it alone is over budget
+            if turns and cost > remaining:
+                break
+            turns.append({"role": message["role"], "content": message["content"]})
+            remaining -= cost
+        return head + turns[::-1]
+
+    def maybe_fold(self, state, model: str, messages: List[dict]):
+        """Starts summarizing the oldest turns if the stored history is over budget."""
+        if state.key in self._folding:
+            return
+        if sum(message_tokens(model, m) for m in messages) <= self.budget:
+            return
+        keep, kept = 0, 0
+        for message in reversed(messages):
+            kept += message_tokens(model, message)
+            if kept > self.budget // 2:
+                break
+            keep += 1
+        old = messages[:len(messages) - max(keep, 1)]
+        if not old:
+            return
+        self._folding.add(state.key)
+        task = asyncio.create_task(self._fold(state, old))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, state, old: List[dict]):
+        try:
+            data = await state.get_data()
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in old)
+            summary = await ai_client.chat(
+                self.summary_model,
+                [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Current summary:\n{data.get('summary') or '(none)'}\n\nNew turns:\n{transcript}"},
+                ],
+                max_tokens=self.summary_tokens
+            )
+            if not summary:
+                return
+            # The conversation moved on meanwhile; drop the folded turns only if they are still at the front
+            data = await state.get_data()
+            messages = data.get("messages", [])
+            if messages[:len(old)] != old:
+                return
+            await state.update_data(messages=messages[len(old):], summary=summary)
+        except Exception as e:
+            logger.error(f"Conversation summary failed: {e}")
+        finally:
+            self._folding.discard(state.key)
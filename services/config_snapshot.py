@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import async_database
+import database
+from config import Config
+from services.keyword_matcher import KeywordMatcher
+from services.source_filter import normalize_source
+
+logger = logging.getLogger(__name__)
+
+# How often the watcher checks the config version stamp, in seconds
+CONFIG_POLL_INTERVAL = 2.0
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable view of the userbot settings as of one `config_version`."""
+    version: int
+    sources: Tuple[str, ...]
+    source_names: frozenset
+    target: Optional[str]
+    spam_keywords: Tuple[str, ...]
+    spam_types: frozenset
+    ai_enabled: bool
+    ai_model: Optional[str]
+    keyword_matcher: KeywordMatcher = field(compare=False, repr=False)
+
+    @classmethod
+    def load(cls) -> "ConfigSnapshot":
+        data = database.read_config()
+        ai = data['ai_settings'] or {}
+        return cls(
+            version=data['version'],
+            sources=tuple(data['sources']),
+            source_names=frozenset(normalize_source(s) for s in data['sources'] if s and s.strip()),
+            target=data['target'],
+            spam_keywords=tuple(data['spam_keywords']),
+            spam_types=frozenset(data['spam_types']),
+            ai_enabled=bool(ai.get('enabled')),
+            ai_model=ai.get('model'),
+            keyword_matcher=KeywordMatcher(data['spam_keywords'], Config.SPAM_TRANSLITERATE),
+        )
+
+class ConfigWatcher:
+    """
+    Keeps `current` in sync with the database. Only the single-row version
+    stamp is polled; the full snapshot is rebuilt when it changes.
+    """
+
+    def __init__(self, poll_interval: float = CONFIG_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.current = ConfigSnapshot.load()
+        self._listeners = []
+
+    def on_change(self, callback):
+        """Registers `callback(snapshot)` to run after each rebuild."""
+        self._listeners.append(callback)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuilds the snapshot if the stored version moved. Returns True if it did."""
+        if not force and database.get_config_version() == self.current.version:
+            return False
+        self.current = ConfigSnapshot.load()
+        return True
+
+    async def watch(self):
+        """Polls the version stamp forever; run it as a background task."""
+        while True:
+            try:
+                if await async_database.run(self.refresh):
+                    logger.info(f"Config reloaded (version {self.current.version})")
+                    await self.notify()
+            except Exception as e:
+                logger.error(f"Config refresh failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def notify(self):
+        for callback in self._listeners:
+            result = callback(self.current)
+            if asyncio.iscoroutine(result):
+                await result
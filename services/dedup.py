@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import re
+import time
+from collections import defaultdict, deque
+from typing import Iterable, Optional
+
+import async_database
+import database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Texts shorter than this many words must match exactly; SimHash is too
+# coarse on a handful of tokens to tell near-duplicates from coincidences.
+MIN_FUZZY_WORDS = 8
+
+# Attribution differs between reposts of the same item, so drop it first
+_NOISE = re.compile(r"(?:https?://\S+|t\.me/\S+|@\w+)", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+
+def tokenize(text: str):
+    return _WORD.findall(_NOISE.sub(" ", text).casefold())
+
+def simhash(words) -> int:
+    """64-bit SimHash over overlapping word shingles."""
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+class DuplicateDetector:
+    """
+    Remembers recently accepted posts and flags new ones that repeat them.
+
+    Posts are remembered per destination (`target`, '' for the global one),
+    so an item sent to one channel is still new for every other channel.
+
+    Text is compared by SimHash: the 64 bits are split into
+    `max_distance + 1` bands, so any hash within `max_distance` bits of a
+    stored one shares at least one band with it and only those candidates
+    are compared. Media is compared by Telegram's `file_unique_id`. The
+    window is bounded by count and age and mirrored to `seen_posts` so it
+    survives restarts.
+    """
+
+    def __init__(self, window_size: int = Config.DEDUP_WINDOW_SIZE,
+                 window_seconds: int = Config.DEDUP_WINDOW_HOURS * 3600,
+                 max_distance: int = Config.DEDUP_MAX_DISTANCE):
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self._window = deque()  # (target, kind, fingerprint, created_at), oldest first
+        self._band_index = [defaultdict(set) for _ in range(self.bands)]  # (target, band value) -> hashes
+        self._exact = set()  # (target, short-text hash)
+        self._media = set()  # (target, file_unique_id)
+        self._added = 0
+
+    async def load(self):
+        """Restores the window from the database."""
+        since = int(time.time()) - self.window_seconds
+        rows = await async_database.run(database.get_seen_posts, since, self.window_size)
+        for target, kind, fingerprint, created_at in rows:
+            self._insert(target, kind, fingerprint, created_at)
+        logger.info(f"Duplicate detector loaded {len(rows)} recent posts")
+
+    def check(self, text: str, media_ids: Iterable[str] = (), target: str = "") -> Optional[str]:
+        """Returns why the post is a duplicate for `target`, or None if it is new there."""
+        for media_id in media_ids:
+            if (target, media_id) in self._media:
+                return f"media {media_id} already posted"
+        if text:
+            kind, fingerprint = self._text_fingerprint(text)
+            if kind == "exact" and (target, fingerprint) in self._exact:
+                return "identical text already posted"
+            if kind == "simhash":
+                distance = self._nearest(target, int(fingerprint, 16))
+                if distance is not None:
+                    return f"near-duplicate text (distance {distance})"
+        return None
+
+    def reserve(self, text: str, media_ids: Iterable[str] = (), targets: Iterable[str] = ("",)) -> list:
+        """
+        Adds a post accepted for `targets` to the window and returns its rows.
+        Nothing is awaited, so a copy arriving meanwhile is caught. Hand the
+        rows to `remember()` once the post is queued, or to `release()` if
+        queueing it failed.
+        """
+        now = int(time.time())
+        fingerprints = [("media", media_id) for media_id in media_ids]
+        if text:
+            fingerprints.append(self._text_fingerprint(text))
+        rows = [(target, kind, fingerprint, now) for target in targets for kind, fingerprint in fingerprints]
+        for row in rows:
+            self._insert(*row)
+        self._expire(now)
+        return rows
+
+    def release(self, rows: Iterable[tuple]):
+        """Takes reserved rows out of the window again, so the post counts as new."""
+        for row in rows:
+            try:
+                self._window.remove(row)
+            except ValueError:
+                continue  # already expired
+            self._discard(*row[:3])
+
+    async def remember(self, rows: list):
+        """Persists reserved rows, so they survive restarts."""
+        if not rows:
+            return
+        try:
+            await async_database.run(database.add_seen_posts, rows)
+            self._added += len(rows)
+            if self._added >= self.window_size // 10:
+                self._added = 0
+                await async_database.run(
+                    database.prune_seen_posts, int(time.time()) - self.window_seconds, self.window_size
+                )
+        except Exception as e:
+            logger.error(f"Failed to persist seen post: {e}")
+
+    def _text_fingerprint(self, text: str):
+        words = tokenize(text)
+        h = simhash(words)
+        kind = "simhash" if len(words) >= MIN_FUZZY_WORDS else "exact"
+        return kind, f"{h:016x}"
+
+    def _bands_of(self, h: int):
+        mask = (1 << self.band_bits) - 1
+        return [(h >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def _nearest(self, target: str, h: int) -> Optional[int]:
+        candidates = set()
+        for band, value in enumerate(self._bands_of(h)):
+            candidates |= self._band_index[band].get((target, value), set())
+        distances = [bin(h ^ other).count("1") for other in candidates]
+        best = min(distances, default=None)
+        return best if best is not None and best <= self.max_distance else None
+
+    def _insert(self, target: str, kind: str, fingerprint: str, created_at: int):
+        self._window.append((target, kind, fingerprint, created_at))
+        if kind == "media":
+            self._media.add((target, fingerprint))
+        elif kind == "exact":
+            self._exact.add((target, fingerprint))
+        else:
+            h = int(fingerprint, 16)
+            for band, value in enumerate(self._bands_of(h)):
+                self._band_index[band][(target, value)].add(h)
+        self._expire(created_at)
+
+    def _expire(self, now: int):
+        cutoff = now - self.window_seconds
+        while self._window and (len(self._window) > self.window_size or self._window[0][3] <= cutoff):
+            target, kind, fingerprint, _ = self._window.popleft()
+            self._discard(target, kind, fingerprint)
+
+    def _discard(self, target: str, kind: str, fingerprint: str):
+        if kind == "media":
+            self._media.discard((target, fingerprint))
+        elif kind == "exact":
+            self._exact.discard((target, fingerprint))
+        else:
+            h = int(fingerprint, 16)
+            for band, value in enumerate(self._bands_of(h)):
+                bucket = self._band_index[band].get((target, value))
+                if bucket is not None:
+                    bucket.discard(h)
+                    if not bucket:
+                        del self._band_index[band][(target, value)]
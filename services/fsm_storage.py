@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from copy import copy
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import async_database
+import database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+    ))
+
+def encode_data(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def decode_data(blob: Optional[bytes]) -> dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8")) if blob else {}
+
+class _Record:
+    __slots__ = ("state", "data", "size", "touched", "dirty")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None, size: int = 0):
+        self.state = state
+        self.data = data or {}
+        self.size = size
+        self.touched = time.time()
+        self.dirty = False
+
+class SQLiteLRUStorage(BaseStorage):
+    """
+    aiogram FSM storage with a bounded in-memory tier over SQLite.
+
+    The `max_entries` most recently used conversations stay in an LRU; the
+    rest live in the `fsm_storage` table as zlib-compressed JSON and are
+    loaded back on their next update. Changes are written behind: when an
+    entry falls out of the LRU, and in batches every `flush_interval`
+    seconds, so state survives restarts without a disk write per message.
+    Conversations idle for longer than `idle_ttl` are dropped from both
+    tiers. `stats()` reports the size of the in-memory tier.
+    """
+
+    def __init__(self, max_entries: int = Config.FSM_MEMORY_ENTRIES,
+                 idle_ttl: int = Config.FSM_IDLE_DAYS * 86400,
+                 flush_interval: float = Config.FSM_FLUSH_SECONDS):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._memory: "OrderedDict[str, _Record]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        record.dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        record = await self._record(key)
+        record.data = data.copy()
+        record.size = len(json.dumps(record.data, ensure_ascii=False, default=str))
+        record.dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Any = None) -> Any:
+        return copy((await self._record(storage_key)).data.get(dict_key, default))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def start(self):
+        """Starts the periodic flush and idle eviction task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    def stats(self) -> dict:
+        return {
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'memory_bytes': sum(record.size for record in self._memory.values()),
+            'dirty': sum(1 for record in self._memory.values() if record.dirty),
+        }
+
+    async def flush(self):
+        """Writes every changed conversation in one transaction."""
+        await self._write([(name, record) for name, record in self._memory.items() if record.dirty])
+
+    async def _record(self, key: StorageKey) -> _Record:
+        name = _key(key)
+        record = self._memory.get(name)
+        if record is None:
+            row = await async_database.get_fsm_record(name)
+            # Another update for the same chat may have loaded it meanwhile
+            record = self._memory.get(name)
+            if record is None:
+                record = _Record()
+                if row:
+                    record.state, blob = row
+                    record.data = decode_data(blob)
+                    record.size = len(json.dumps(record.data, ensure_ascii=False, default=str))
+                self._memory[name] = record
+                await self._evict_overflow()
+        self._memory.move_to_end(name)
+        record.touched = time.time()
+        return record
+
+    async def _evict_overflow(self):
+        spilled = []
+        while len(self._memory) > self.max_entries:
+            name, record = self._memory.popitem(last=False)
+            if record.dirty:
+                spilled.append((name, record))
+        await self._write(spilled)
+
+    async def _write(self, items):
+        if not items:
+            return
+        rows = []
+        now = int(time.time())
+        for name, record in items:
+            record.dirty = False
+            if record.state is None and not record.data:
+                rows.append((name, None, None, now))  # cleared: delete the row
+            else:
+                rows.append((name, record.state, encode_data(record.data), now))
+        try:
+            await async_database.save_fsm_records(rows)
+        except Exception as e:
+            logger.error(f"FSM storage write failed: {e}")
+            for name, record in items:
+                record.dirty = True
+                # Keep spilled entries in memory rather than lose them
+                self._memory.setdefault(name, record)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                cutoff = time.time() - self.idle_ttl
+                for name in [name for name, record in self._memory.items() if record.touched < cutoff]:
+                    del self._memory[name]
+                removed = await async_database.run(database.prune_fsm_records, int(cutoff))
+                if removed:
+                    logger.info(f"FSM storage dropped {removed} idle conversations; memory: {self.stats()}")
+            except Exception as e:
+                logger.error(f"FSM storage maintenance failed: {e}")
@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+from config import Config
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow images are sent as downloaded
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Decoding and re-encoding is CPU work; keep it off the event loop and the DB pool
+_executor = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS, thread_name_prefix="image")
+
+def pick_photo_size(photo, min_side: int = Config.CAPTION_IMAGE_MIN_SIDE) -> Tuple[str, int, int]:
+    """
+    (file_id, width, height) of the smallest version of `photo` whose short
+    side is at least `min_side`, from the photo itself and its thumbnails.
+    Falls back to the largest version if none is big enough.
+    """
+    sizes = [(photo.file_id, photo.width, photo.height)]
+    sizes += [(thumb.file_id, thumb.width, thumb.height) for thumb in (photo.thumbs or []) if thumb.width and thumb.height]
+    adequate = [size for size in sizes if min(size[1], size[2]) >= min_side]
+    if adequate:
+        return min(adequate, key=lambda size: size[1] * size[2])
+    return max(sizes, key=lambda size: size[1] * size[2])
+
+def shrink(buffer: io.BytesIO, max_pixels: int = Config.CAPTION_IMAGE_MAX_PIXELS,
+           quality: int = Config.CAPTION_IMAGE_QUALITY) -> memoryview:
+    """Downsizes to at most `max_pixels` and recompresses as JPEG; the input is returned if already small."""
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        width, height = image.size
+        if width * height <= max_pixels:
+            return buffer.getbuffer()
+        scale = (max_pixels / (width * height)) ** 0.5
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        # JPEG can decode straight at a reduced scale, skipping the full-size bitmap
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        image.thumbnail(size)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+    return out.getbuffer()
+
+async def prepare_image(client, photo) -> str:
+    """Downloads a right-sized version of `photo` and returns it as a JPEG data URL."""
+    file_id, width, height = pick_photo_size(photo)
+    buffer = await client.download_media(file_id, in_memory=True)
+    data = buffer.getbuffer()
+    if Image is not None and width * height > Config.CAPTION_IMAGE_MAX_PIXELS:
+        data.release()
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(_executor, shrink, buffer)
+        except Exception as e:
+            logger.warning(f"Could not shrink image, sending it as downloaded: {e}")
+            data = buffer.getbuffer()
+    # Encode from the buffer directly rather than copying it into bytes first
+    encoded = base64.b64encode(data).decode("ascii")
+    data.release()
+    return f"data:image/jpeg;base64,{encoded}"
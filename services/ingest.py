@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import async_database
+import database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Posts held in memory for the workers; anything beyond waits in the database
+QUEUE_SIZE = 1000
+# Seconds between sweeps for pending rows that never made it into the queue
+SWEEP_INTERVAL = 30
+
+class AIWorkerPool:
+    """
+    Background stage of the ingest pipeline.
+
+    The message handler only stores a raw `pending_ai` row and calls
+    `submit()`. A fixed number of workers then run `process(post, message)`
+    for each row and mark it ready for the scheduler, so slow completions
+    never hold up Pyrogram's handlers. `process` returns the new caption, or
+    None to keep the original text. Rows left pending by a restart or a full
+    queue are picked up by a periodic sweep.
+    """
+
+    def __init__(self, process: Callable[[dict, Optional[object]], Awaitable[Optional[str]]],
+                 workers: int = Config.AI_WORKERS):
+        self.process = process
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._queued = set()
+        self._tasks = []
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    def submit(self, post_id: int, message=None):
+        """Queues a stored post. The source message spares a refetch for captions."""
+        if post_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait((post_id, message))
+            self._queued.add(post_id)
+        except asyncio.QueueFull:
+            logger.warning(f"AI queue full, post {post_id} will be picked up by the next sweep")
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize()
+
+    async def _sweep(self):
+        while True:
+            try:
+                free = QUEUE_SIZE - self._queue.qsize()
+                if free > 0:
+                    for post_id in await async_database.get_pending_ai_posts(free):
+                        self.submit(post_id)
+            except Exception as e:
+                logger.error(f"Pending post sweep failed: {e}")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def _worker(self, index: int):
+        while True:
+            post_id, message = await self._queue.get()
+            try:
+                post = await async_database.get_post(post_id)
+                if post and post['status'] == database.POST_PENDING_AI:
+                    caption = None
+                    try:
+                        caption = await self.process(post, message)
+                    except Exception as e:
+                        logger.error(f"AI worker {index} failed on post {post_id}: {e}")
+                    # On failure the post goes out with its original text
+                    await async_database.mark_post_ready(post_id, caption)
+            except Exception as e:
+                logger.error(f"AI worker {index} could not update post {post_id}: {e}")
+            finally:
+                self._queued.discard(post_id)
+                self._queue.task_done()
@@ -0,0 +1,76 @@
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+# Uzbek/Russian Cyrillic -> Uzbek Latin, so "реклама" also matches "reklama"
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "'",
+    "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya", "ў": "o'", "қ": "q",
+    "ғ": "g'", "ҳ": "h",
+})
+
+# The many apostrophes used in o‘zbek / gʻalaba spellings
+_APOSTROPHES = str.maketrans({c: "'" for c in "ʻʼ‘’`´"})
+
+class KeywordMatcher:
+    """
+    Finds any of a (large) set of spam keywords in a text in one regex pass.
+
+    Keywords and texts are NFKC-normalized and casefolded, and optionally
+    transliterated from Cyrillic to Latin. The keywords are compiled into a
+    trie-shaped regex, so matching cost grows with the text, not with the
+    number of keywords.
+    """
+
+    def __init__(self, keywords: Iterable[str], transliterate: bool = True):
+        self.transliterate = transliterate
+        normalized = {self.normalize(str(kw)) for kw in keywords}
+        normalized.discard("")
+        self.size = len(normalized)
+        self._pattern = re.compile(_trie_pattern(normalized)) if normalized else None
+
+    def normalize(self, text: str) -> str:
+        text = unicodedata.normalize("NFKC", text).casefold().translate(_APOSTROPHES)
+        if self.transliterate:
+            text = text.translate(_CYRILLIC_TO_LATIN)
+        return text
+
+    def search(self, text: str) -> Optional[str]:
+        """Returns the first keyword found in `text` (normalized), or None."""
+        if self._pattern is None or not text:
+            return None
+        match = self._pattern.search(self.normalize(text))
+        return match.group(0) if match else None
+
+    def __len__(self):
+        return self.size
+
+def _trie_pattern(words) -> str:
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_node_pattern(trie)
+
+def _trie_node_pattern(root) -> str:
+    # Built bottom-up with an explicit stack; recursing once per character
+    # would overflow on a long keyword
+    patterns = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        # A keyword ends here: matching this prefix is enough, longer ones are redundant
+        if "" in node:
+            patterns[id(node)] = ""
+        elif not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.values())
+        else:
+            parts = [re.escape(char) + patterns[id(child)] for char, child in sorted(node.items())]
+            patterns[id(node)] = parts[0] if len(parts) == 1 else "(?:" + "|".join(parts) + ")"
+    return patterns[id(root)]
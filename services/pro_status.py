@@ -0,0 +1,78 @@
+import copy
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import async_database
+from config import Config
+from models import pro_users
+from models.pro_users import ProUser
+
+def _parse_expiry(user: Optional[ProUser]) -> Optional[datetime.date]:
+    try:
+        return datetime.datetime.strptime(user.expires_at, "%Y-%m-%d").date() if user else None
+    except (TypeError, ValueError):
+        return None
+
+class ProStatusCache:
+    """
+    Per-user PRO lookups without loading the whole `pro_users` table.
+
+    Entries, including "not PRO" for free users, are kept in an LRU for
+    `ttl` seconds. Writes through `models.pro_users` replace the entry
+    immediately, so a new or revoked licence takes effect at once in this
+    process; the TTL only covers writes made elsewhere. Expiry is checked
+    on every lookup rather than when the entry was loaded.
+    """
+
+    def __init__(self, ttl: int = Config.PRO_CACHE_TTL_SECONDS, max_size: int = Config.PRO_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (user, expires_on, loaded_at)
+        # Writes may come from DB executor threads
+        self._lock = threading.Lock()
+
+    async def get(self, user_id: int) -> Optional[ProUser]:
+        """The user's PRO record (expired or not), or None."""
+        return (await self._entry(user_id))[0]
+
+    async def get_active(self, user_id: int) -> Optional[ProUser]:
+        """The user's PRO record if the subscription is active and not expired."""
+        user, expires_on, _ = await self._entry(user_id)
+        if user and user.active and expires_on and expires_on >= datetime.datetime.utcnow().date():
+            return user
+        return None
+
+    async def is_pro(self, user_id: int) -> bool:
+        return await self.get_active(user_id) is not None
+
+    def store(self, user_id: int, user: Optional[ProUser]):
+        """Write-through hook for `models.pro_users`."""
+        with self._lock:
+            self._put(user_id, copy.deepcopy(user))
+
+    async def _entry(self, user_id: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[2] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry
+        started = time.monotonic()
+        user = await async_database.load_pro_user(user_id)
+        with self._lock:
+            # A write-through that landed while we were loading is newer
+            entry = self._entries.get(user_id)
+            if entry is None or entry[2] < started:
+                self._put(user_id, user)
+            return self._entries[user_id]
+
+    def _put(self, user_id: int, user: Optional[ProUser]):
+        self._entries[user_id] = (user, _parse_expiry(user), time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+pro_status = ProStatusCache()
+pro_users.on_change(pro_status.store)
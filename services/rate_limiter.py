@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+import async_database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Per-user request quotas over a sliding window, kept in memory.
+
+    Each user's window is split into `buckets` slots; a request counts
+    against the limit until its slot slides out of the window. `try_acquire()`
+    checks and reserves in one step without touching the disk. Changed
+    counters are written to the `users` table in one batch every
+    `flush_interval` seconds (and on shutdown), and a user's window is read
+    back the first time they are seen after a restart.
+
+    Limits are per tier; a limit of 0 means unlimited and is not tracked.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None,
+                 window: int = Config.RATE_WINDOW_HOURS * 3600, buckets: int = 24,
+                 flush_interval: float = Config.RATE_FLUSH_SECONDS):
+        self.limits = limits if limits is not None else {'free': Config.RATE_LIMIT_FREE, 'pro': Config.RATE_LIMIT_PRO}
+        self.bucket_seconds = max(1, window // buckets)
+        self.buckets = buckets
+        self.flush_interval = flush_interval
+        self._windows: Dict[int, Dict[int, int]] = {}  # user_id -> {bucket: count}
+        self._dirty = set()
+
+    async def try_acquire(self, user_id: int, tier: str = 'free') -> bool:
+        """Reserves one request for `user_id`; False if the tier's limit is reached."""
+        limit = self.limits.get(tier, 0)
+        if not limit:
+            return True
+        if user_id not in self._windows:
+            await self._load(user_id)
+        # No awaits from here on, so concurrent requests can't both take the last slot
+        window = self._current(user_id)
+        if sum(window.values()) >= limit:
+            return False
+        bucket = self._bucket()
+        window[bucket] = window.get(bucket, 0) + 1
+        self._dirty.add(user_id)
+        return True
+
+    def release(self, user_id: int, tier: str = 'free'):
+        """Gives back a reservation whose request failed."""
+        window = self._windows.get(user_id)
+        if not self.limits.get(tier, 0) or not window:
+            return
+        bucket = max(window)
+        window[bucket] -= 1
+        if not window[bucket]:
+            del window[bucket]
+        self._dirty.add(user_id)
+
+    async def flush(self):
+        """Writes changed counters to the database in one transaction."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        today = datetime.date.today().isoformat()
+        rows = []
+        for user_id in dirty:
+            window = self._current(user_id)
+            rows.append((user_id, sum(window.values()), today, json.dumps(window)))
+        try:
+            await async_database.save_user_usage(rows)
+        except Exception as e:
+            logger.error(f"Rate limiter flush failed, will retry: {e}")
+            self._dirty |= dirty
+            return
+        # Users with nothing left in their window don't need to stay in memory
+        for user_id in dirty:
+            if user_id not in self._dirty and not self._windows.get(user_id):
+                self._windows.pop(user_id, None)
+
+    async def run(self):
+        """Flushes periodically forever; run it as a background task."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _bucket(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // self.bucket_seconds)
+
+    def _current(self, user_id: int) -> Dict[int, int]:
+        """The user's window with expired buckets dropped."""
+        window = self._windows.setdefault(user_id, {})
+        oldest = self._bucket() - self.buckets + 1
+        for bucket in [b for b in window if b < oldest]:
+            del window[bucket]
+        return window
+
+    async def _load(self, user_id: int):
+        row = await async_database.get_user_usage(user_id)
+        if user_id in self._windows:
+            return
+        window = {}
+        if row:
+            requests_count, last_request_date, usage_window = row
+            if usage_window:
+                window = {int(bucket): count for bucket, count in json.loads(usage_window).items()}
+            elif requests_count and last_request_date == datetime.date.today().isoformat():
+                # Written before the sliding window existed: count today's requests as recent
+                window = {self._bucket(): requests_count}
+        self._windows[user_id] = window
+
+rate_limiter = RateLimiter()
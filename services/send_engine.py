@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+from pyrogram.errors import FloodWait
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Allows `rate` sends per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def ready_at(self, now: float) -> float:
+        """Monotonic time at which the next token is available."""
+        self._refill(now)
+        if self._tokens >= 1:
+            return now
+        return now + (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+class SendEngine:
+    """
+    Sends jobs to several destinations concurrently within Telegram's limits.
+
+    Every destination has its own token bucket, and a shared bucket caps the
+    account as a whole. A destination has at most one send in flight, so
+    posts reach each chat in order, while up to `concurrency` destinations
+    are served at once. A `FloodWait` blocks only its destination for the
+    exact delay Telegram asked for; the job is retried afterwards and other
+    destinations carry on meanwhile. If a destination is blocked for longer
+    than `max_hold` seconds, its remaining jobs are handed to `on_defer`
+    with the wall-clock time they may be retried.
+
+    Any other exception from `send` is passed to `on_error`.
+    """
+
+    def __init__(self,
+                 send: Callable[[Any], Awaitable[None]],
+                 on_error: Callable[[Any, Exception], Awaitable[None]],
+                 on_defer: Callable[[Any, float], Awaitable[None]],
+                 concurrency: int = Config.SEND_CONCURRENCY,
+                 per_target_rate: float = Config.SEND_PER_TARGET_PER_MINUTE / 60,
+                 per_target_burst: int = Config.SEND_PER_TARGET_BURST,
+                 global_rate: float = Config.SEND_GLOBAL_PER_SECOND,
+                 max_hold: float = Config.SEND_FLOOD_MAX_HOLD):
+        self.send = send
+        self.on_error = on_error
+        self.on_defer = on_defer
+        self.concurrency = concurrency
+        self.per_target_rate = per_target_rate
+        self.per_target_burst = per_target_burst
+        self.max_hold = max_hold
+        self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._blocked_until: Dict[Hashable, float] = {}
+
+    def _bucket(self, destination) -> TokenBucket:
+        if destination not in self._buckets:
+            self._buckets[destination] = TokenBucket(self.per_target_rate, self.per_target_burst)
+        return self._buckets[destination]
+
+    def _ready_at(self, destination, now: float) -> float:
+        return max(
+            self._blocked_until.get(destination, now),
+            self._bucket(destination).ready_at(now),
+            self._global.ready_at(now),
+        )
+
+    async def dispatch(self, jobs: Iterable[Tuple[Hashable, Any]]):
+        """Sends `(destination, job)` pairs and returns once every job is settled."""
+        queues: Dict[Hashable, deque] = {}
+        for destination, job in jobs:
+            queues.setdefault(destination, deque()).append(job)
+        running: Dict[asyncio.Task, Tuple[Hashable, Any]] = {}
+        busy = set()
+
+        while queues or running:
+            now = time.monotonic()
+            wait = None
+            for destination in list(queues):
+                if destination in busy or len(running) >= self.concurrency:
+                    continue
+                ready_at = self._ready_at(destination, now)
+                if ready_at - now > self.max_hold:
+                    # Don't sit on leased posts; give them back until the wait is over
+                    retry_at = time.time() + (ready_at - now)
+                    for job in queues.pop(destination):
+                        await self.on_defer(job, retry_at)
+                    continue
+                if ready_at > now:
+                    wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                    continue
+                self._bucket(destination).take(now)
+                self._global.take(now)
+                job = queues[destination].popleft()
+                if not queues[destination]:
+                    del queues[destination]
+                busy.add(destination)
+                running[asyncio.create_task(self._attempt(destination, job))] = (destination, job)
+
+            if not running:
+                if queues:
+                    await asyncio.sleep(max(wait or 0, 0.01))
+                continue
+            done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                destination, job = running.pop(task)
+                busy.discard(destination)
+                if not task.result():
+                    # Flood-waited: retry first once the destination unblocks
+                    queues.setdefault(destination, deque()).appendleft(job)
+
+    async def _attempt(self, destination, job) -> bool:
+        """Sends one job; returns False if it must be retried after a FloodWait."""
+        try:
+            await self.send(job)
+        except FloodWait as e:
+            delay = float(e.value or 1)
+            self._blocked_until[destination] = time.monotonic() + delay
+            logger.warning(f"FloodWait of {delay:.0f}s for {destination}")
+            return False
+        except Exception as e:
+            try:
+                await self.on_error(job, e)
+            except Exception as error:
+                logger.error(f"Error handler failed for a send to {destination}: {error}")
+        return True
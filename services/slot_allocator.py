@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import async_database
+from config import Config
+from services.source_filter import normalize_source
+
+logger = logging.getLogger(__name__)
+
+def parse_quiet_hours(value: str) -> Optional[Tuple[int, int]]:
+    """'23-7' -> (23, 7); empty or malformed values disable quiet hours."""
+    try:
+        start, end = (int(part) % 24 for part in value.split("-"))
+    except ValueError:
+        if value.strip():
+            logger.warning(f"Ignoring malformed quiet hours {value!r}")
+        return None
+    return (start, end) if start != end else None
+
+class SlotAllocator:
+    """
+    Hands out posting times per target.
+
+    Each target's cursor (the last slot given out) lives in memory, and a
+    slot is taken from it without an await in between, so posts arriving
+    together always get distinct slots. The next slot is the cursor plus
+    the spacing divided by the source's weight, but never earlier than the
+    initial delay from now, and pushed past quiet hours. Only the cursor is
+    written back, so a restart continues where the calendar left off.
+    """
+
+    def __init__(self, spacing_minutes: float = Config.SLOT_SPACING_MINUTES,
+                 initial_delay_minutes: float = Config.SLOT_INITIAL_DELAY_MINUTES,
+                 quiet_hours: str = Config.SLOT_QUIET_HOURS,
+                 source_weights: Dict[str, float] = Config.SLOT_SOURCE_WEIGHTS):
+        self.spacing = spacing_minutes * 60
+        self.initial_delay = initial_delay_minutes * 60
+        self.quiet_hours = parse_quiet_hours(quiet_hours)
+        self.source_weights = {normalize_source(name): weight for name, weight in source_weights.items() if weight > 0}
+        self._cursors: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+    def weight(self, source_keys: Iterable) -> float:
+        """Weight of the first configured source key (chat ID or username), default 1."""
+        for key in source_keys:
+            if key is not None:
+                weight = self.source_weights.get(normalize_source(str(key)))
+                if weight:
+                    return weight
+        return 1.0
+
+    async def allocate(self, target: str, source_keys: Iterable = ()) -> datetime.datetime:
+        """Reserves the next slot for a post from `source_keys` to `target`."""
+        key = normalize_source(target or "")
+        if key not in self._cursors:
+            await self._load(key)
+
+        # No awaits from here until the cursor is moved
+        now = time.time()
+        slot = max(self._cursors[key] + self.spacing / self.weight(source_keys), now + self.initial_delay)
+        slot = int(self._skip_quiet_hours(slot))
+        self._cursors[key] = slot
+
+        try:
+            await async_database.set_slot_cursor(key, slot)
+        except Exception as e:
+            logger.error(f"Could not persist slot cursor for {key}: {e}")
+        return datetime.datetime.fromtimestamp(slot)
+
+    async def _load(self, key: str):
+        async with self._lock:
+            if key in self._cursors:
+                return
+            cursor = await async_database.get_slot_cursor(key)
+            if cursor is None:
+                # First use for this target: continue after whatever is queued
+                last = await async_database.get_last_scheduled_time()
+                cursor = int(last.timestamp()) if last else 0
+            self._cursors[key] = cursor
+
+    def _skip_quiet_hours(self, slot: float) -> float:
+        if not self.quiet_hours:
+            return slot
+        start, end = self.quiet_hours
+        moment = datetime.datetime.fromtimestamp(slot)
+        hour = moment.hour
+        quiet = start <= hour < end if start < end else hour >= start or hour < end
+        if not quiet:
+            return slot
+        resume = moment.replace(hour=end, minute=0, second=0, microsecond=0)
+        if resume <= moment:
+            resume += datetime.timedelta(days=1)
+        return resume.timestamp()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from pyrogram import filters
+from pyrogram.errors import FloodWait, UserNotParticipant
+
+import async_database
+
+logger = logging.getLogger(__name__)
+
+# Seconds between retries of sources that failed to resolve
+RETRY_INTERVAL = 60
+# Seconds between full re-resolves, to pick up renamed or reassigned usernames
+REFRESH_INTERVAL = 6 * 60 * 60
+
+_LINK_PREFIX = re.compile(r"^(?:https?://)?(?:t\.me/|telegram\.me/)|^@", re.IGNORECASE)
+
+def normalize_source(source: str) -> str:
+    """'@Name', 't.me/Name' and 'https://t.me/Name' all become 'name'."""
+    return _LINK_PREFIX.sub("", source.strip()).strip("/").lower()
+
+class SourceFilter:
+    """
+    Matches messages from the configured source chats by chat ID.
+
+    Usernames are resolved to IDs once and kept in a set, so the per-update
+    check is a single membership test. Call `update()` with the new source
+    list whenever the config changes; `maintain()` retries failed peers and
+    periodically re-resolves everything in the background.
+
+    Telegram only delivers channel updates to members, so a source the
+    account is not in yet is joined when it is first resolved. Known
+    memberships are stored in the database and restored by `start()`, so a
+    restart neither waits for nor re-sends any joins. Sources the account
+    can't join or read are logged and retried like unresolvable ones, and
+    never matched. After a FloodWait no source is resolved until it has
+    passed; the skipped ones are retried by `maintain()`.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.chat_ids: Set[int] = set()
+        # Which configured source names each chat ID was resolved from
+        self.names_by_chat: Dict[int, FrozenSet[str]] = {}
+        self._resolved: Dict[str, int] = {}
+        self._failed: Set[str] = set()
+        # Source name -> chat ID of chats the account is known to be in
+        self._members: Dict[str, int] = {}
+        self._flood_until = 0.0
+        self._sources: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+        async def check(flt, client, message):
+            return message.chat is not None and message.chat.id in self.chat_ids
+
+        self.filter = filters.create(check, "SourceFilter")
+
+    async def start(self, client, sources: Iterable[str]):
+        self.client = client
+        self._members = await async_database.get_source_memberships()
+        wanted = {normalize_source(s) for s in sources if s and s.strip()}
+        self._resolved.update({name: chat_id for name, chat_id in self._members.items() if name in wanted})
+        self._rebuild()
+        await self.update(sources)
+
+    async def update(self, sources: Iterable[str]):
+        """Resolves newly added sources and drops removed ones."""
+        wanted = {normalize_source(s) for s in sources if s and s.strip()}
+        async with self._lock:
+            self._sources = wanted
+            for name in set(self._resolved) - wanted:
+                del self._resolved[name]
+            self._failed &= wanted
+            self._rebuild()
+            for name in wanted - set(self._resolved):
+                await self._resolve(name)
+
+    async def maintain(self):
+        """Background task: retry failures often, re-resolve everything rarely."""
+        since_refresh = 0
+        while True:
+            await asyncio.sleep(RETRY_INTERVAL)
+            since_refresh += RETRY_INTERVAL
+            try:
+                async with self._lock:
+                    if since_refresh >= REFRESH_INTERVAL:
+                        since_refresh = 0
+                        names = set(self._sources)
+                    else:
+                        names = set(self._failed)
+                    for name in names:
+                        await self._resolve(name)
+            except Exception as e:
+                logger.error(f"Source re-resolve failed: {e}")
+
+    async def _resolve(self, name: str) -> Optional[int]:
+        if self.client is None or time.monotonic() < self._flood_until:
+            self._failed.add(name)
+            return None
+        try:
+            if name.lstrip("-").isdigit():
+                # Chats can't be joined by ID; it only works if the account is already in it
+                chat = await self.client.get_chat(int(name))
+            else:
+                chat = await self.client.get_chat(name)
+                if self._members.get(name) != chat.id:
+                    await self._ensure_member(name, chat.id)
+            chat_id = chat.id
+        except FloodWait as e:
+            # Don't sleep here: callers hold the lock that update() waits on
+            logger.warning(f"FloodWait resolving {name}, pausing resolves for {e.value}s")
+            self._flood_until = time.monotonic() + e.value
+            self._failed.add(name)
+            return None
+        except Exception as e:
+            logger.warning(f"Source {name} can't be joined or read, ignoring it: {e}")
+            self._failed.add(name)
+            return None
+        self._resolved[name] = chat_id
+        self._failed.discard(name)
+        self._rebuild()
+        return chat_id
+
+    async def _ensure_member(self, name: str, chat_id: int):
+        """Joins `name` unless the account is already in it, and records the membership."""
+        try:
+            await self.client.get_chat_member(chat_id, "me")
+        except UserNotParticipant:
+            await self.client.join_chat(name)
+            logger.info(f"Joined source {name}")
+        await async_database.add_source_membership(name, chat_id)
+        self._members[name] = chat_id
+
+    def names_of(self, chat_id: int) -> FrozenSet[str]:
+        """Normalized source names that resolved to `chat_id`."""
+        return self.names_by_chat.get(chat_id, frozenset())
+
+    def _rebuild(self):
+        # Swap in new objects so concurrent checks never see a half-built one
+        names_by_chat: Dict[int, Set[str]] = {}
+        for name, chat_id in self._resolved.items():
+            names_by_chat.setdefault(chat_id, set()).add(name)
+        self.names_by_chat = {chat_id: frozenset(names) for chat_id, names in names_by_chat.items()}
+        self.chat_ids = set(self._resolved.values())
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit on the text of one message
+MESSAGE_LIMIT = 4096
+PLACEHOLDER = "…"
+
+def split_point(text: str, limit: int = MESSAGE_LIMIT) -> int:
+    """Where to cut `text` so the head fits in `limit`: a paragraph, line or word break if possible."""
+    for separator in ("\n\n", "\n", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut
+    return limit
+
+class StreamingReply:
+    """
+    Shows a completion in a chat while it is being generated.
+
+    `start()` sends a placeholder right away; `feed()` appends text and edits
+    the message at most once per `edit_interval` seconds, backing off when
+    Telegram asks to. Text beyond 4096 characters is cut at a paragraph,
+    line or word break and continues in a new message. `finish()` writes the
+    final text and returns it. Replies are sent as plain text, since half a
+    reply may not be valid markup.
+    """
+
+    def __init__(self, message: Message, edit_interval: float = Config.STREAM_EDIT_INTERVAL):
+        self.message = message
+        self.edit_interval = edit_interval
+        self._reply: Optional[Message] = None
+        self._parts: List[str] = []  # finished messages
+        self._current = ""
+        self._shown = ""
+        self._next_edit = 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts) + self._current
+
+    async def start(self):
+        self._reply = await self.message.answer(PLACEHOLDER, parse_mode=None)
+
+    async def feed(self, delta: str):
+        self._current += delta
+        while len(self._current) > MESSAGE_LIMIT:
+            cut = split_point(self._current)
+            head, self._current = self._current[:cut], self._current[cut:]
+            self._parts.append(head)
+            await self._show(head.rstrip(), force=True)
+            # The rest continues in a new message
+            self._reply = None
+            self._current = self._current.lstrip()
+        await self._show(self._current)
+
+    async def finish(self) -> str:
+        await self._show(self._current, force=True)
+        return self.text
+
+    async def abort(self, notice: str):
+        """Reports a failure in place of the placeholder, or after any partial text."""
+        if self._reply is not None and not self._shown:
+            await self._edit(notice, force=True)
+        else:
+            await self.message.answer(notice, parse_mode=None)
+
+    async def _show(self, text: str, force: bool = False):
+        if not text.strip() or text == self._shown:
+            return
+        if self._reply is None:
+            self._reply = await self.message.answer(text, parse_mode=None)
+            self._shown = text
+            self._next_edit = time.monotonic() + self.edit_interval
+            return
+        await self._edit(text, force)
+
+    async def _edit(self, text: str, force: bool = False):
+        now = time.monotonic()
+        if now < self._next_edit:
+            if not force:
+                return
+            await asyncio.sleep(self._next_edit - now)
+        try:
+            await self._reply.edit_text(text, parse_mode=None)
+            self._shown = text
+        except TelegramRetryAfter as e:
+            self._next_edit = time.monotonic() + e.retry_after
+            if force:
+                await self._edit(text, force)
+            return
+        except TelegramBadRequest as e:
+            # Raised when the text didn't change; anything else is worth a log line
+            if "not modified" not in str(e):
+                logger.warning(f"Could not update streamed reply: {e}")
+        self._next_edit = time.monotonic() + self.edit_interval
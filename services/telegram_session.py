@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Union
+
+from pyrogram import Client
+from pyrogram.errors import ChannelInvalid, ChannelPrivate, PeerIdInvalid, UsernameInvalid, UsernameNotOccupied
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a successful request before the connection is probed
+HEALTH_CHECK_INTERVAL = 120
+HEALTH_CHECK_TIMEOUT = 15
+# Reconnect backoff bounds, in seconds
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+# Errors meaning a cached peer is stale and must be resolved again
+PEER_ERRORS = (ChannelInvalid, ChannelPrivate, PeerIdInvalid, UsernameInvalid, UsernameNotOccupied)
+
+class PersistentClient:
+    """
+    Keeps one Pyrogram client connected for the lifetime of the process.
+
+    `ensure_connected()` starts the client on first use, probes it with
+    `get_me()` after a quiet period and reconnects with backoff when it is
+    down. `resolve()` turns a @username into a chat ID once and caches it,
+    so sends skip the username lookup.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._peers: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._last_ok = 0.0
+        self._healthy = False
+
+    async def ensure_connected(self) -> Client:
+        async with self._lock:
+            if not self._healthy or not self.client.is_connected:
+                await self._reconnect()
+            elif time.monotonic() - self._last_ok > HEALTH_CHECK_INTERVAL:
+                try:
+                    await asyncio.wait_for(self.client.get_me(), HEALTH_CHECK_TIMEOUT)
+                    self.mark_ok()
+                except Exception as e:
+                    logger.warning(f"Telegram health check failed, reconnecting: {e}")
+                    await self._reconnect()
+        return self.client
+
+    def mark_ok(self):
+        """Records a successful request, postponing the next health check."""
+        self._last_ok = time.monotonic()
+
+    def mark_failed(self, error: Exception):
+        """Reacts to a failed request: stale peers are dropped, dead connections reconnected."""
+        if isinstance(error, PEER_ERRORS):
+            self._peers.clear()
+        elif isinstance(error, (ConnectionError, OSError, asyncio.TimeoutError)):
+            self._healthy = False
+
+    async def resolve(self, chat: Union[int, str]) -> Union[int, str]:
+        """Returns the cached chat ID for `chat`, resolving it on first use."""
+        if isinstance(chat, int):
+            return chat
+        key = chat.strip().lower()
+        if key not in self._peers:
+            resolved = await self.client.get_chat(chat)
+            self._peers[key] = resolved.id
+        return self._peers[key]
+
+    async def stop(self):
+        async with self._lock:
+            if self.client.is_connected:
+                await self.client.stop()
+            self._healthy = False
+
+    async def _reconnect(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if self.client.is_connected:
+                    await self.client.stop()
+            except Exception as e:
+                logger.warning(f"Error while stopping Telegram client: {e}")
+            try:
+                await self.client.start()
+                self._healthy = True
+                self.mark_ok()
+                logger.info("Telegram client connected")
+                return
+            except Exception as e:
+                logger.error(f"Telegram connect failed, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+import async_database
+from config import Config
+from models import pro_users
+from services.keyword_matcher import KeywordMatcher
+from services.source_filter import normalize_source
+
+logger = logging.getLogger(__name__)
+
+# How often the router checks the PRO users version stamp, in seconds
+TENANT_POLL_INTERVAL = 2.0
+
+_TARGET_PREFIX = re.compile(r"^(?:https?://)?(?:t\.me/|telegram\.me/)?@?", re.IGNORECASE)
+_PUBLIC_USERNAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]{3,31}$")
+
+def channel_tag(target: Optional[str]) -> Optional[str]:
+    """'@name' for a public channel given by username or t.me link; None for IDs and invite links."""
+    if not target:
+        return None
+    name = _TARGET_PREFIX.sub("", str(target).strip()).strip("/")
+    return f"@{name}" if _PUBLIC_USERNAME.match(name) else None
+
+@dataclass(frozen=True)
+class Tenant:
+    """Routing view of one PRO user's forwarding settings."""
+    user_id: int
+    target: Optional[str]
+    sources: FrozenSet[str]
+    expires_at: Optional[datetime.date]
+    active: bool
+    ai_enabled: bool
+    ai_model: str
+    media_types: FrozenSet[str]
+    keyword_matcher: KeywordMatcher = field(compare=False, repr=False)
+
+    @classmethod
+    def from_pro_user(cls, user: pro_users.ProUser) -> "Tenant":
+        try:
+            expires_at = datetime.datetime.strptime(user.expires_at, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            expires_at = None
+        return cls(
+            user_id=user.telegram_id,
+            target=user.target_channel,
+            sources=frozenset(normalize_source(s) for s in user.source_channels if s and s.strip()),
+            expires_at=expires_at,
+            active=user.active,
+            ai_enabled=user.ai_enabled,
+            # Older rows store the menu name rather than the model ID
+            ai_model=Config.AI_MODELS.get(user.ai_model, user.ai_model),
+            media_types=frozenset(t.strip().lower() for t in user.media_types if t and t.strip()),
+            keyword_matcher=KeywordMatcher(user.filters, Config.SPAM_TRANSLITERATE),
+        )
+
+    @property
+    def tag(self) -> Optional[str]:
+        """The tenant's own channel tag for their posts, if their target has a public name."""
+        return channel_tag(self.target)
+
+    def is_live(self, today: datetime.date) -> bool:
+        return self.active and bool(self.target) and self.expires_at is not None and self.expires_at >= today
+
+    def accepts(self, text: str, content_types: Iterable[str]) -> bool:
+        """Applies the tenant's keyword filters and allowed media types (empty allows all)."""
+        if self.keyword_matcher.search(text):
+            return False
+        return not self.media_types or all(t in self.media_types for t in content_types)
+
+class TenantRouter:
+    """
+    Routes source posts to the PRO users subscribed to them.
+
+    An inverted index maps each normalized source name to the IDs of the
+    tenants reading it, so routing a message costs one lookup per name the
+    chat is known by. `watch()` polls the 'pro_users' version stamp; on a
+    change only the users whose row revision moved are reloaded and
+    re-indexed, and deleted users are dropped.
+    """
+
+    def __init__(self, poll_interval: float = TENANT_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.tenants: Dict[int, Tenant] = {}
+        self._by_source: Dict[str, Set[int]] = {}
+        self._revisions: Dict[int, int] = {}
+        self._version = None
+        self._listeners = []
+
+    def on_change(self, callback):
+        """Registers `callback(router)` to run after the index changed."""
+        self._listeners.append(callback)
+
+    @property
+    def sources(self) -> Set[str]:
+        """Every source name some tenant subscribes to."""
+        return set(self._by_source)
+
+    def route(self, source_names: Iterable[str]) -> List[Tenant]:
+        """Returns the live tenants subscribed to any of `source_names`."""
+        user_ids = set()
+        for name in source_names:
+            user_ids |= self._by_source.get(name, set())
+        today = datetime.datetime.utcnow().date()
+        return [tenant for user_id in sorted(user_ids) if (tenant := self.tenants[user_id]).is_live(today)]
+
+    async def refresh(self) -> bool:
+        """Applies PRO user changes since the last refresh. Returns True if any."""
+        version = await async_database.get_config_version('pro_users')
+        if version == self._version:
+            return False
+        revisions = await async_database.get_pro_user_revisions()
+        changed = [user_id for user_id, revision in revisions.items() if self._revisions.get(user_id) != revision]
+        removed = set(self._revisions) - set(revisions)
+        users = await async_database.load_pro_users_by_id(changed) if changed else []
+
+        # Applied on the event loop with no awaits, so `route()` never sees a partial update
+        for user_id in removed | set(changed):
+            self._unindex(user_id)
+        for user in users:
+            self._index(Tenant.from_pro_user(user))
+        self._revisions = revisions
+        self._version = version
+        if changed or removed:
+            logger.info(f"Tenant index updated: {len(changed)} changed, {len(removed)} removed, {len(self.tenants)} total")
+        return bool(changed or removed)
+
+    async def watch(self):
+        """Polls for PRO user changes forever; run it as a background task."""
+        while True:
+            try:
+                if await self.refresh():
+                    for callback in self._listeners:
+                        result = callback(self)
+                        if asyncio.iscoroutine(result):
+                            await result
+            except Exception as e:
+                logger.error(f"Tenant refresh failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _index(self, tenant: Tenant):
+        self.tenants[tenant.user_id] = tenant
+        for name in tenant.sources:
+            self._by_source.setdefault(name, set()).add(tenant.user_id)
+
+    def _unindex(self, user_id: int):
+        tenant = self.tenants.pop(user_id, None)
+        if not tenant:
+            return
+        for name in tenant.sources:
+            subscribers = self._by_source.get(name)
+            if subscribers:
+                subscribers.discard(user_id)
+                if not subscribers:
+                    del self._by_source[name]
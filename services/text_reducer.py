@@ -0,0 +1,98 @@
+import re
+from dataclasses import dataclass
+
+from config import Config
+from services.chat_context import count_tokens
+
+# Telegram usernames, but not the middle of an e-mail address
+_MENTION = re.compile(r"(?<![\w@.])@[A-Za-z][A-Za-z0-9_]{3,31}\b")
+# Only Telegram links: other links usually point at the story itself
+_TELEGRAM_LINK = re.compile(r"(?:https?://)?(?:www\.)?(?:t\.me|telegram\.me|telegram\.dog)/[^\s)\]]*", re.IGNORECASE)
+_EMOJI = "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF]\uFE0F?"
+_REPEATED_EMOJI = re.compile(rf"({_EMOJI})(?:\s*\1)+")
+# Calls to subscribe that channels put under their posts
+_FOOTER = re.compile(
+    r"\b(?:subscribe|follow us|join us|our channel|obuna bo\S{0,2}ling|kanal(?:imiz)?ga|"
+    r"подпи(?:шись|шитесь|саться)|наш канал|присоединяйтесь)\b",
+    re.IGNORECASE
+)
+# Footers are short; a longer line that mentions subscribing is content
+FOOTER_MAX_WORDS = 8
+_WORD = re.compile(r"\w")
+_SPACES = re.compile(r"[ \t\u00A0]{2,}")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Left behind where a mention or link ended a sentence
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([.,;:!?])")
+
+@dataclass(frozen=True)
+class Reduction:
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    @property
+    def useful(self) -> bool:
+        return sum(ch.isalnum() for ch in self.text) >= Config.TEXT_MIN_USEFUL_CHARS
+
+def _strip_attribution(line: str) -> str:
+    return _TELEGRAM_LINK.sub("", _MENTION.sub("", line))
+
+def reduce_text(text: str) -> str:
+    """
+    Strips what the paraphrase prompt would otherwise ask the model to drop:
+    Telegram mentions and links, repeated emoji, and trailing signature or
+    subscribe lines.
+    """
+    lines = text.splitlines()
+    # Trailing lines that are only a signature, a short call to subscribe or
+    # decoration; the last line with any content always stays
+    while lines:
+        tail = _strip_attribution(lines[-1])
+        if _WORD.search(tail):
+            if not _FOOTER.search(tail) or len(tail.split()) > FOOTER_MAX_WORDS:
+                break
+            if not any(_WORD.search(_strip_attribution(line)) for line in lines[:-1]):
+                break
+        lines.pop()
+    cleaned = []
+    for line in lines:
+        line = _strip_attribution(line)
+        line = _REPEATED_EMOJI.sub(r"\1", line)
+        line = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", _SPACES.sub(" ", line))
+        cleaned.append(line.strip())
+    return _BLANK_LINES.sub("\n\n", "\n".join(cleaned)).strip()
+
+class TextReducer:
+    """
+    Runs `reduce_text()` on posts bound for the model and tallies the prompt
+    tokens it saves. A post with nothing useful left is counted as `empty`;
+    the caller should not send it to the model, but post the original.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.tokens_before = 0
+        self.tokens_saved = 0
+        self.empty = 0
+
+    def reduce(self, text: str, model: str) -> Reduction:
+        reduced = reduce_text(text)
+        result = Reduction(reduced, count_tokens(model, text), count_tokens(model, reduced) if reduced else 0)
+        self.messages += 1
+        self.tokens_before += result.tokens_before
+        self.tokens_saved += result.saved
+        if not result.useful:
+            self.empty += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'messages': self.messages,
+            'tokens_saved': self.tokens_saved,
+            'saved_rate': self.tokens_saved / self.tokens_before if self.tokens_before else 0.0,
+            'empty': self.empty,
+        }
@@ -0,0 +1,154 @@
+import re
+from collections import Counter
+from typing import Dict, Tuple
+
+from config import Config
+
+# What the AI stage does with a post's text
+PARAPHRASE = "paraphrase"
+TRANSLATE = "translate"
+TAG_ONLY = "tag"
+
+_WORD = re.compile(r"[^\W\d_]+(?:[\u02BB\u02BC'\u2018\u2019`][^\W\d_]+)?")
+_LATIN = re.compile(r"[A-Za-z]")
+_CYRILLIC = re.compile(r"[\u0400-\u04FF]")
+# Letters used by Uzbek Cyrillic but not by Russian
+_UZBEK_CYRILLIC = re.compile(r"[ўқғҳЎҚҒҲ]")
+
+# Frequent trigrams of space-padded words ("_" stands for the padding)
+_TRIGRAMS = {
+    "en": frozenset(t.replace("_", " ") for t in (
+        "the and ing ion tio ent ati for her ter hat tha ere ate his con res ver all ons nce men ith ted "
+        "ers pro thi wit are ess not ive was ect rea com eve per int est sta cti ica ist ear ain one our "
+        "iti rat ned has ill age igh ght pri ric ice ord rec new tor ark ket ous nal ove ide ell ree "
+        "out ome ure ase ows ock oun ort art own ake ond ail lin low ade "
+        "_th _an _in _of _to _co _re _be _fo _pr _wa _ha _he _st _wi _on _is _it _de _ma _se _pa _ne "
+        "_ca _di _hi _mo _wh _sh _fr _pe _bu _ex _al _as _at _by _fi _po _ar _so _ch _me _mi _pl _tr "
+        "_sa _ra _la _ri _hu _ye _up _ov _af _ag _gr _le _ti _ad _ju _sl _fe _dr _ta _ki _cl _ho "
+        "he_ ed_ nd_ ng_ er_ es_ on_ of_ to_ at_ is_ in_ ts_ ly_ re_ st_ an_ al_ nt_ ce_ se_ rs_ ay_ "
+        "le_ ow_ ew_ ds_ ks_ gh_ th_ ns_ ry_ ll_ or_ ar_ ps_ ws_ ls_ rd_ ms_ ge_ ne_ ck_ ty_"
+    ).split()),
+    "uz": frozenset(t.replace("_", " ") for t in (
+        "lar nin ish gan dan ini ida ari bil ila lik uch chu oli yil ham kat shi qil lga iga lan ega "
+        "osh mas kor ala day yan ikl gal rin ris asi sid ilg tir ekt amd mda ush hla ayt ydi ldi tga "
+        "adi moq ang ayo ozi qon onu nun urs kur ana shd arl gi' o'z o'l bo' yo' qo' ko' g'a o'r "
+        "liq qla rga sha tda ikk kki ill lla uvc ovc ovi ati ikd mla vch org nda ton arx rxi dag oni "
+        "zbe bek kis "
+        "_va _bu _bi _bo _qi _yi _ha _ma _ta _ko _o' _ka _ya _so _da _uc _ol _be _ti _sh _mi _xa "
+        "_ke _qo _g' _ay _yu _to _ba _us "
+        "ni_ ga_ da_ an_ di_ ri_ gi_ ar_ si_ ik_ ir_ sh_ ul_ ki_ ti_ mi_ li_ ha_ ng_ qa_ oq_ ak_ ch_"
+    ).split()),
+}
+# Function words; they carry most of the signal in a headline
+_STOPWORDS = {
+    "en": frozenset(
+        "the a an of to in on for and is are was were with by at from as new after over into says said "
+        "has have will be its it this that up down more than amid against out about".split()
+    ),
+    "uz": frozenset(
+        "va bu bilan uchun ham deb edi esa emas kerak yana yangi bo'yicha qilib etdi qildi bo'ldi "
+        "bo'ladi mln mlrd so'm yil yilda bugun haqida dan keyin".split()
+    ),
+}
+# Latin text with fewer trigrams than this goes to the best scoring language
+# when it leads and clears a low floor; longer text must reach TRIAGE_MIN_SCORE
+_SHORT_TRIGRAMS = 80
+_SHORT_MIN_SCORE = 0.25
+_APOSTROPHE = str.maketrans({c: "'" for c in "\u02BB\u02BC\u2018\u2019`"})
+# Letters outside ASCII other than apostrophes: not English, not Uzbek Latin
+_NON_ASCII_LETTER = re.compile(r"[^\W\d_A-Za-z\u02BB\u02BC]")
+
+def _latin_scores(text: str) -> Tuple[Dict[str, float], int]:
+    """Per-language score (share of profile trigrams plus share of function words) and the trigram count."""
+    words = [word.translate(_APOSTROPHE) for word in _WORD.findall(text.casefold())]
+    trigrams = Counter()
+    for word in words:
+        padded = f" {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    total = sum(trigrams.values())
+    scores = {}
+    for language, profile in _TRIGRAMS.items():
+        trigram_share = sum(count for trigram, count in trigrams.items() if trigram in profile) / total if total else 0.0
+        stopword_share = sum(word in _STOPWORDS[language] for word in words) / len(words) if words else 0.0
+        scores[language] = trigram_share + stopword_share
+    return scores, total
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """
+    ("en", "uz", "ru" or "other", score). Cyrillic text is told apart by
+    script letters. Latin text is scored by its share of each language's
+    common trigrams and function words, and goes to the best scoring
+    language if it leads; the bar is lower for short text, which has few
+    trigrams to score.
+    Letters outside ASCII rule out both English and Uzbek.
+    """
+    latin = len(_LATIN.findall(text))
+    cyrillic = len(_CYRILLIC.findall(text))
+    if not latin and not cyrillic:
+        return "other", 0.0
+    if cyrillic > latin:
+        return ("uz" if _UZBEK_CYRILLIC.search(text) else "ru"), cyrillic / (latin + cyrillic)
+    if _NON_ASCII_LETTER.search(text):
+        return "other", 0.0
+    scores, total = _latin_scores(text)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (language, score), (_, runner_up) = ranked[0], ranked[1]
+    if score <= runner_up:
+        return "other", score
+    if score < (Config.TRIAGE_MIN_SCORE if total >= _SHORT_TRIGRAMS else _SHORT_MIN_SCORE):
+        return "other", score
+    return language, score
+
+def novelty(text: str) -> float:
+    """
+    Share of the text that is distinct prose: unique words over all tokens,
+    where numbers and symbols count as tokens but not as words. Scores,
+    price lists and slogans come out low.
+    """
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    words = [word.casefold() for word in _WORD.findall(text)]
+    return len(set(words)) / len(tokens)
+
+class Triage:
+    """
+    Picks the cheapest AI treatment a post's text needs.
+
+    Long, varied text gets the full paraphrase. Short or low-novelty text
+    (see `novelty()`) is not worth rewriting: in English it only gets the
+    channel tag appended locally, in other languages it is translated with
+    the cheaper translation model and prompt. Decisions and their outcomes
+    are counted for `stats()`.
+    """
+
+    def __init__(self, short_words: int = Config.TRIAGE_SHORT_WORDS,
+                 min_novelty: float = Config.TRIAGE_MIN_NOVELTY):
+        self.short_words = short_words
+        self.min_novelty = min_novelty
+        self.decisions = Counter()
+        self.outcomes = Counter()
+
+    def decide(self, text: str) -> Tuple[str, str]:
+        """(treatment, reason) for a post's cleaned text."""
+        language, confidence = detect_language(text)
+        words = len(_WORD.findall(text))
+        score = novelty(text)
+        if words >= self.short_words and score >= self.min_novelty:
+            treatment = PARAPHRASE
+        elif language == "en":
+            treatment = TAG_ONLY
+        else:
+            treatment = TRANSLATE
+        self.decisions[treatment] += 1
+        return treatment, f"{language} ({confidence:.2f}), {words} words, novelty {score:.2f}"
+
+    def record(self, treatment: str, ok: bool):
+        """Counts whether a treatment that needed the model produced text."""
+        self.outcomes[(treatment, ok)] += 1
+
+    def stats(self) -> dict:
+        return {
+            'decisions': dict(self.decisions),
+            'failed': {treatment: count for (treatment, ok), count in self.outcomes.items() if not ok},
+        }
@@ -0,0 +1,65 @@
+import pytest
+
+from services.triage import PARAPHRASE, TAG_ONLY, TRANSLATE, Triage, detect_language
+
+ENGLISH_HEADLINES = [
+    "Stocks fell sharply on Monday",
+    "Bitcoin price jumps to new record high",
+    "President signs new law on taxes",
+    "Apple unveils new iPhone",
+    "Oil prices drop as demand slows",
+    "Markets closed higher today.",
+    "Tesla recalls 2 million cars",
+    "Fed holds rates steady",
+    "Gold hits all-time high",
+    "Google fined $2bn by EU regulators",
+    "Heavy rain floods city streets",
+    "Ukraine and Russia agree prisoner swap",
+]
+
+UZBEK_HEADLINES = [
+    "Prezident yangi qonunni imzoladi",
+    "Dollar kursi yana oshdi",
+    "Toshkentda havo harorati pasayadi",
+    "Bugun ob-havo issiq bo'ladi",
+    "Oʻzbekistonda benzin narxi oshdi",
+    "Samarqandda yangi mehmonxona ochildi",
+]
+
+@pytest.mark.parametrize("text", ENGLISH_HEADLINES)
+def test_short_english_headlines_are_english(text):
+    assert detect_language(text)[0] == "en"
+
+@pytest.mark.parametrize("text", UZBEK_HEADLINES)
+def test_short_uzbek_headlines_are_uzbek(text):
+    assert detect_language(text)[0] == "uz"
+
+@pytest.mark.parametrize("text, language", [
+    ("Президент подписал новый закон о налогах", "ru"),
+    ("Ўзбекистон ҳукумати янги қарор қабул қилди", "uz"),
+    ("Der Präsident hat heute ein neues Gesetz unterzeichnet.", "other"),
+    ("Türkiye'de enflasyon yükseldi", "other"),
+    ("El presidente firmó una nueva ley", "other"),
+    ("12:30 — 14:00", "other"),
+])
+def test_other_scripts_and_languages(text, language):
+    assert detect_language(text)[0] == language
+
+@pytest.mark.parametrize("text", ENGLISH_HEADLINES)
+def test_short_english_gets_the_tag_only(text):
+    assert Triage().decide(text)[0] == TAG_ONLY
+
+@pytest.mark.parametrize("text", UZBEK_HEADLINES)
+def test_short_uzbek_is_translated(text):
+    assert Triage().decide(text)[0] == TRANSLATE
+
+def test_long_varied_text_is_paraphrased():
+    text = (
+        "The central bank raised its key interest rate by half a point on Thursday, citing persistent "
+        "inflation and a weaker currency, and signalled that further increases were likely this year."
+    )
+    assert Triage().decide(text)[0] == PARAPHRASE
+
+def test_low_novelty_text_is_not_paraphrased():
+    text = "USD 12650 EUR 13700 RUB 140 GBP 16000 CNY 1750 KZT 25 JPY 85 CHF 14300 TRY 390 AED 3440 USD 12650"
+    assert Triage().decide(text)[0] != PARAPHRASE
@@ -1,81 +1,127 @@
 import sqlite3
-from pyrogram import Client, filters
+from pyrogram import Client, filters, idle
 import re
+import asyncio
 import database
-import openai
+import async_database
 from config import config
-import base64
-import io
+from db_migration import migrate
+from services.config_snapshot import ConfigWatcher
+from services.source_filter import SourceFilter, normalize_source
+from services import ai_client
+from services.ai_cache import ResultCache, make_key, normalize_text
+from services.dedup import DuplicateDetector
+from services.ingest import AIWorkerPool
+from services.slot_allocator import SlotAllocator
+from services.album_buffer import AlbumBuffer
+from services.chat_context import load_encodings
+from services.tenant_router import TenantRouter, channel_tag
+from services.image_prep import prepare_image
+from services.text_reducer import TextReducer
+from services.triage import Triage, PARAPHRASE, TRANSLATE, TAG_ONLY
 import datetime
 
-def reload_config():
-    global SOURCE_CHANNELS, TARGET_CHANNEL, SPAM_KEYWORDS, SPAM_TYPES, AI_SETTINGS
-    SOURCE_CHANNELS = database.get_all_sources()
-    TARGET_CHANNEL = database.get_target_chat()
-    SPAM_KEYWORDS = database.get_all_spam_keywords()
-    SPAM_TYPES = database.get_all_spam_types()
-    AI_SETTINGS = database.get_ai_status()
+migrate()
 
-reload_config()
+# Settings are read from an immutable snapshot that is rebuilt in the
+# background whenever the admin panel bumps the config version.
+config_watcher = ConfigWatcher()
+# Source chats are matched by resolved chat ID and follow config changes
+source_filter = SourceFilter()
+# PRO users' own source -> target routes, indexed by source
+tenants = TenantRouter()
+
+def _all_sources():
+    return set(config_watcher.current.sources) | tenants.sources
+
+config_watcher.on_change(lambda cfg: source_filter.update(_all_sources()))
+tenants.on_change(lambda router: source_filter.update(_all_sources()))
 
-openai.api_key = config.OPENAI_API_KEY
-DB_NAME = "userbot.db"
-SPAM_TYPES = database.get_all_spam_types()
 API_ID = 26265257
 API_HASH = "d82296fe28dd3589b08624b04449dbf8"
 
-app = Client("userbot", API_ID, API_HASH)
+app = Client(config.USERBOT_SESSION, API_ID, API_HASH)
+
+# Paraphrases and captions are reused across cross-posted copies of a post.
+# Bump a prompt version whenever its prompt text changes.
+ai_cache = ResultCache()
+CAPTION_MODEL = "gpt-4-vision-preview"
+CAPTION_PROMPT_VERSION = 2
+PARAPHRASE_PROMPT_VERSION = 2
+TRANSLATE_PROMPT_VERSION = 2
+# Signs posts for the global target. Tenant posts carry their own channel's
+# tag, or none; the tag is part of the cache key of prompts that add it.
+CHANNEL_TAG = "@abclegacynews"
+
+# Source channels repost each other; drop repeats before paying for AI
+duplicates = DuplicateDetector()
+
+# Spaces posts out on the target channel
+slots = SlotAllocator()
+
+# Strips mentions, links and signatures before text reaches the model
+reducer = TextReducer()
+# Sends only long, varied text to the full paraphrase
+triage = Triage()
 
 @app.on_message(filters.command("reload"))
 async def reload_handler(client, message):
-    reload_config()
+    await async_database.run(config_watcher.refresh, True)
+    await config_watcher.notify()
     await message.reply_text("✅ Configuration reloaded without restart.")
 
 
 @app.on_message(filters.command("info"))
 async def reload_command(client, message):
+    cfg = config_watcher.current
     msg = ""
-    msg += f"Source channels: {", ".join(SOURCE_CHANNELS)}\n"
-    msg += f"Target: {TARGET_CHANNEL}\n"
+    msg += f"Source channels: {', '.join(cfg.sources)}\n"
+    msg += f"Target: {cfg.target}\n"
+    msg += f"AI queue: {ai_workers.backlog} posts waiting for a worker\n"
+    stats = ai_cache.stats()
+    msg += (
+        f"AI cache: {stats['hits']} hits ({stats['memory_hits']} memory, {stats['disk_hits']} disk), "
+        f"{stats['misses']} misses, {stats['hit_rate']:.0%} hit rate, ~{stats['saved_seconds']:.0f}s saved\n"
+    )
+    stats = reducer.stats()
+    msg += (
+        f"Text reduction: {stats['tokens_saved']} prompt tokens saved over {stats['messages']} posts "
+        f"({stats['saved_rate']:.0%}), {stats['empty']} with nothing left to send\n"
+    )
+    stats = triage.stats()
+    msg += f"AI triage: {stats['decisions']}, failed: {stats['failed']}\n"
 
     await message.reply_text(msg)
 
-@app.on_message(filters.chat(SOURCE_CHANNELS))
+@app.on_message(source_filter.filter)
 async def forward_message(client, message):
-    text = message.text or message.caption or ""
-
-    for kw in SPAM_KEYWORDS:
-        if str(kw).lower() in text.lower():
-            return
-
-    # 2️⃣ Check spammed types (skip if it matches a blocked type)
-    spammed_types = SPAM_TYPES
-    if ("text" in spammed_types and message.text) or \
-       ("file" in spammed_types and message.document) or \
-       ("photo" in spammed_types and message.photo) or \
-       ("video" in spammed_types and message.video) or \
-       ("location" in spammed_types and message.location) or \
-       ("contact" in spammed_types and message.contact):
+    # Album items arrive one by one; collect them and ingest the album once
+    if message.media_group_id:
+        albums.add(message)
         return
+    await ingest([message])
+
 
-    # AI Processing Logic
-    if message.photo and not message.caption and bool(AI_SETTINGS['enabled']):
-        # If it's a photo without a caption and AI is on, generate a new one.
-        generated_caption = await generate_caption_for_image(message)
-        if generated_caption:
-            text = generated_caption
-    elif bool(AI_SETTINGS['enabled']) and text:
-        # For all other message types with text, paraphrase it.
-        paraphrased_content = await paraphrase(text, AI_SETTINGS['model'])
-        if paraphrased_content:
-            text = paraphrased_content
+async def ingest(messages):
+    """
+    Filters a post (one message, or every item of an album) and queues it
+    for the global target and for every PRO tenant subscribed to its source.
+    """
+    cfg = config_watcher.current
+    message = messages[0]
+    # An album's text is the caption of whichever item carries one
+    text = next((m.text or m.caption for m in messages if m.text or m.caption), "")
 
     # Queueing Logic
     content_type = None
     file_id = None
     caption = text
+    album_media = None
 
-    if message.photo:
+    if len(messages) > 1:
+        content_type = 'album'
+        album_media = [item for m in messages if (item := _album_item(m))]
+    elif message.photo:
         content_type = 'photo'
         file_id = message.photo.file_id
     elif message.video:
@@ -101,83 +147,282 @@ async def forward_message(client, message):
     if not content_type:
         return # Skip unsupported message types
 
-    # Calculate scheduled time
-    last_scheduled_time = database.get_last_scheduled_time()
-    if last_scheduled_time:
-        scheduled_for = last_scheduled_time + datetime.timedelta(minutes=30)
+    # Work out every destination first: (target, tenant ID, AI on, AI model, tag).
+    # The global pipeline leaves target and model unset so queued posts
+    # follow later changes to the global settings.
+    source_names = source_filter.names_of(message.chat.id)
+    routes = []
+    if source_names & cfg.source_names and _passes_global_filters(cfg, messages, text):
+        routes.append((None, None, cfg.ai_enabled, None, CHANNEL_TAG))
+    content_types = [item[0] for item in album_media] if album_media else [content_type]
+    for tenant in tenants.route(source_names):
+        if tenant.accepts(text, content_types):
+            routes.append((tenant.target, tenant.user_id, tenant.ai_enabled, tenant.ai_model, tenant.tag))
+    if not routes:
+        return
+
+    # 3️⃣ Drop reposts of posts recently sent to the same destination before
+    # any AI work. Checking and reserving happen without an await in
+    # between, so two copies arriving together can't both pass.
+    media_ids = [media.file_unique_id for m in messages if (media := _media_of(m))]
+    reserved = []  # (route, dedup rows)
+    for route in routes:
+        reason = duplicates.check(text, media_ids, _dedup_target(route))
+        if reason:
+            destination = f"tenant {route[1]} ({route[0]})" if route[1] else "the target"
+            print(f"⏭️ Skipped message from {message.chat.title} for {destination}: {reason}")
+        else:
+            reserved.append((route, duplicates.reserve(text, media_ids, (_dedup_target(route),))))
+    if not reserved:
+        return
+    routes = [route for route, _ in reserved]
+
+    # A reservation is kept only once its post is queued; if queueing fails,
+    # later reposts of the item must still get through
+    queued = 0
+    try:
+        # Mentions, links and signatures are stripped locally rather than by the
+        # model, for every route that sends the text to it
+        reduction = None
+        if text and any(route[2] for route in routes):
+            reduction = reducer.reduce(text, cfg.ai_model)
+        ai_text = reduction.text if reduction and reduction.useful else ""
+        treatment, reason = triage.decide(ai_text) if ai_text else (None, "")
+
+        for target, tenant_id, ai_enabled, ai_model, tag in routes:
+            # AI work happens in the background workers; here we only decide what
+            # they should do with the post. An album gets one call for its caption,
+            # and tenants sharing a model share the call through the AI cache.
+            ai_task = None
+            post_caption = caption
+            if ai_enabled and reduction:
+                # The model gets the cleaned text; if too little is left to be worth
+                # a call, the original goes out as is with the route's tag
+                post_caption = ai_text if ai_text else _with_tag(caption, tag)
+            if message.photo and ai_enabled and not text:
+                # If it's a photo without a caption and AI is on, generate a new one.
+                ai_task = 'caption'
+            elif ai_enabled and ai_text:
+                # For all other message types with text, give it the cheapest
+                # treatment it needs; a tag alone is added right here.
+                if treatment == TAG_ONLY:
+                    post_caption = _with_tag(ai_text, tag)
+                else:
+                    ai_task = treatment
+
+            # Reserve the next free posting slot for the target
+            scheduled_for = await slots.allocate(target or cfg.target, (message.chat.id, message.chat.username))
+
+            # Add to queue
+            post_id = await async_database.add_to_queue(
+                source_message_id=message.id,
+                source_chat_id=message.chat.id,
+                content_type=content_type,
+                file_id=file_id,
+                caption=post_caption,
+                scheduled_for=scheduled_for,
+                status=database.POST_PENDING_AI if ai_task else database.POST_READY,
+                ai_task=ai_task,
+                media=album_media,
+                target=target,
+                tenant_id=tenant_id,
+                ai_model=ai_model
+            )
+            queued += 1
+            if ai_task:
+                ai_workers.submit(post_id, message)
+            kind = f"Album of {len(messages)}" if album_media else "Message"
+            destination = f"tenant {tenant_id} ({target})" if tenant_id else "the target"
+            note = ""
+            if ai_enabled and ai_text:
+                note = f", {treatment} for {reason}, {reduction.saved} prompt tokens saved"
+            elif ai_enabled and reduction:
+                note = ", original posted: too little text to rewrite"
+            print(f"✅ {kind} from {message.chat.title} queued for {destination} at {scheduled_for.strftime('%Y-%m-%d %H:%M:%S')}{note}")
+    finally:
+        for _, rows in reserved[queued:]:
+            duplicates.release(rows)
+        await duplicates.remember([row for _, rows in reserved[:queued] for row in rows])
+
+
+def _dedup_target(route):
+    # The global pipeline follows whatever the target is set to, so it is one destination
+    target, tenant_id = route[0], route[1]
+    return "" if tenant_id is None else normalize_source(target)
+
+
+def _with_tag(text, tag):
+    return f"{text}\n\n{tag}" if tag else text
+
+
+def _post_tag(post):
+    """The tag of a queued post's route: ours for the global target, the tenant's own otherwise."""
+    return CHANNEL_TAG if post['tenant_id'] is None else channel_tag(post['target'])
+
+
+def _tag_instruction(tag):
+    if not tag:
+        return "Return only the final English text—no tags, commentary or symbols."
+    return f"At the end of the message, add this tag: {tag}\nReturn only the final English text with your tag at the end—no commentary or symbols."
+
+
+def _passes_global_filters(cfg, messages, text) -> bool:
+    # 1️⃣ Skip messages containing a spam keyword
+    if cfg.keyword_matcher.search(text):
+        return False
+
+    # 2️⃣ Check spammed types (skip if any item matches a blocked type)
+    spammed_types = cfg.spam_types
+    for m in messages:
+        if ("text" in spammed_types and m.text) or \
+           ("file" in spammed_types and m.document) or \
+           ("photo" in spammed_types and m.photo) or \
+           ("video" in spammed_types and m.video) or \
+           ("location" in spammed_types and m.location) or \
+           ("contact" in spammed_types and m.contact):
+            return False
+    return True
+
+albums = AlbumBuffer(ingest)
+
+
+async def process_post(post, message):
+    """AI stage of ingest: returns the new caption for a pending post, or None."""
+    cfg = config_watcher.current
+    # Global posts follow the global switch; tenant posts were decided at ingest
+    if post['tenant_id'] is None and not cfg.ai_enabled:
+        return None
+    if post['ai_task'] == 'caption':
+        if message is None:
+            # Picked up after a restart: fetch the source message again
+            message = await app.get_messages(post['source_chat_id'], post['source_message_id'])
+        caption = await generate_caption_for_image(message)
+        return _with_tag(caption, _post_tag(post)) if caption else None
+    if post['ai_task'] == PARAPHRASE and post['caption']:
+        result = await paraphrase(post['caption'], post['ai_model'] or cfg.ai_model, _post_tag(post))
+    elif post['ai_task'] == TRANSLATE and post['caption']:
+        result = await translate(post['caption'], _post_tag(post))
     else:
-        scheduled_for = datetime.datetime.now() + datetime.timedelta(minutes=5)
-
-    # Add to queue
-    database.add_to_queue(
-        source_message_id=message.id,
-        source_chat_id=message.chat.id,
-        content_type=content_type,
-        file_id=file_id,
-        caption=caption,
-        scheduled_for=scheduled_for
-    )
-    print(f"✅ Message from {message.chat.title} queued for {scheduled_for.strftime('%Y-%m-%d %H:%M:%S')}")
+        return None
+    triage.record(post['ai_task'], bool(result))
+    print(f"{'🤖' if result else '⚠️'} Post {post['id']}: {post['ai_task']} {'done' if result else 'failed'}")
+    return result
+
+ai_workers = AIWorkerPool(process_post)
+
+
+def _media_of(message):
+    return (message.photo or message.video or message.document or message.audio
+            or message.voice or message.sticker)
+
+
+def _album_item(message):
+    """(content_type, file_id) of an album item, or None for unsupported media."""
+    for content_type in ('photo', 'video', 'document', 'audio'):
+        media = getattr(message, content_type)
+        if media:
+            return [content_type, media.file_id]
+    return None
 
 
 async def generate_caption_for_image(message):
-    try:
-        # Download image to an in-memory buffer
-        image_buffer = io.BytesIO()
-        await message.download(in_memory=True, file_name=image_buffer)
-        image_buffer.seek(0)
+    # Telegram's file_unique_id identifies the image content itself
+    key = make_key("caption", message.photo.file_unique_id, CAPTION_MODEL, CAPTION_PROMPT_VERSION)
+    return await ai_cache.get_or_create(key, lambda: _generate_caption_for_image(message))
+
 
-        # Encode image to Base64
-        base64_image = base64.b64encode(image_buffer.read()).decode('utf-8')
+async def _generate_caption_for_image(message):
+    try:
+        # A thumbnail-sized copy is plenty for a description and far cheaper to fetch and send
+        image_url = await prepare_image(app, message.photo)
 
         prompt_text = "Bu rasmda nima tasvirlanganini qisqa va tushunarli qilib, bir nechta gap bilan tavsiflab ber."
 
-        response = openai.chat.completions.create(
-            model="gpt-4-vision-preview",
-            messages=[
+        caption = await ai_client.chat(
+            CAPTION_MODEL,
+            [
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt_text},
                         {
                             "type": "image_url",
-                            "image_url": f"data:image/jpeg;base64,{base64_image}"
+                            "image_url": image_url
                         }
                     ]
                 }
             ],
             max_tokens=300
         )
-        caption = response.choices[0].message.content
-        return f"{caption}\n\n@abclegacynews"
+        # The route's tag is added per post, so one cached caption serves every route
+        return caption
     except Exception as e:
         print(f"Error generating caption for image: {e}")
         return None
 
 
-async def paraphrase(text, model: str):
+async def paraphrase(text, model: str, tag=None):
+    key = make_key("paraphrase", normalize_text(text), model, PARAPHRASE_PROMPT_VERSION, tag)
+    return await ai_cache.get_or_create(key, lambda: _paraphrase(text, model, tag))
+
+
+async def _paraphrase(text, model: str, tag=None):
     try:
-        prompt = """
+        prompt = f"""
 Remove all Telegram usernames (e.g., @channelname) and Telegram links (e.g., t.me/channelname) from the message.
 
 Rephrase the message naturally to keep the original meaning but avoid sounding like a direct copy.
 
 If the message is not in English, translate it to English before rephrasing.
 
-At the end of the message, add this tag: @abclegacynews
-Return only the final, cleaned, English version with your tag at the end—no commentary or symbols.
+{_tag_instruction(tag)}
 
         """
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
+        return await ai_client.chat(
+            model,
+            [
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": text}
             ]
         )
-        return response.choices[0].message.content
     except Exception as e:
         print("Error while paraphrasing... ", e)
         return None
 
-app.run()
+async def translate(text, tag=None):
+    key = make_key("translate", normalize_text(text), config.TRANSLATE_MODEL, TRANSLATE_PROMPT_VERSION, tag)
+    return await ai_cache.get_or_create(key, lambda: _translate(text, tag))
+
+
+async def _translate(text, tag=None):
+    try:
+        prompt = f"""
+Translate the message to English. Keep names, numbers, links and line breaks as they are.
+{_tag_instruction(tag)}
+        """
+        return await ai_client.chat(
+            config.TRANSLATE_MODEL,
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": text}
+            ]
+        )
+    except Exception as e:
+        print("Error while translating... ", e)
+        return None
+
+async def main():
+    await app.start()
+    await load_encodings([*config.AI_MODELS.values(), config.TRANSLATE_MODEL])
+    await duplicates.load()
+    await tenants.refresh()
+    ai_workers.start()
+    await source_filter.start(app, _all_sources())
+    asyncio.create_task(source_filter.maintain())
+    asyncio.create_task(config_watcher.watch())
+    asyncio.create_task(tenants.watch())
+    await idle()
+    await app.stop()
+    await ai_client.close()
+
+app.run(main())